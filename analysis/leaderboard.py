@@ -0,0 +1,59 @@
+"""
+Season leaderboards from the results database (see event_utils/results_store.py).
+
+Examples:
+    python -m analysis.leaderboard backfill data
+    python -m analysis.leaderboard standings
+    python -m analysis.leaderboard best-times
+    python -m analysis.leaderboard history path/to/bot.cfg
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import List
+
+from event_utils.results_store import DB_FILE, ResultsStore
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+DEFAULT_DB = DATA_DIR / DB_FILE
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', type=Path, default=DEFAULT_DB)
+    commands = parser.add_subparsers(dest='command', required=True)
+    backfill = commands.add_parser('backfill', help="Ingest every event document under a folder.")
+    backfill.add_argument('data_dir', nargs='?', type=Path, default=DATA_DIR)
+    standings = commands.add_parser('standings', help="Overall standings by points.")
+    standings.add_argument('--event-type')
+    best_times = commands.add_parser('best-times', help="Best WaypointRace times on each course.")
+    best_times.add_argument('--course')
+    history = commands.add_parser('history', help="Every result of one bot.")
+    history.add_argument('bot', help="The bot's config path, as in the event documents.")
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.db)
+    if args.command == 'backfill':
+        print(f"Ingested {store.backfill(args.data_dir)} event documents into {args.db}")
+    elif args.command == 'standings':
+        for place, row in enumerate(store.standings(args.event_type), start=1):
+            print(f"{place:4d}. {row['points']:6d} points  {row['wins']:4d} wins  {row['events']:4d} events  "
+                  f"{row['bot']}")
+    elif args.command == 'best-times':
+        course = None
+        for row in store.best_times(args.course):
+            if row['course_key'] != course:
+                course = row['course_key']
+                print(f"Course {course}:")
+            print(f"  {row['best']:8.3f}  ({row['runs']} runs)  {row['bot']}")
+    elif args.command == 'history':
+        for row in store.bot_history(args.bot):
+            print(f"{row['event_type']:16s} {row['value']:8.3f}  {row['rank']} / {row['entrants']}  "
+                  f"{row['competition_dir']}")
+    store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""
+Re-scores archived competitions from their trajectory recordings and computes per-bot statistics.
+
+Every competition folder under data/ (e.g. data/2026-10-17T15-58-49/) is looked at for event recordings
+(see event_utils/trajectory_recorder.py). WaypointRace results are worked out again from the recorded
+car locations and compared with the result_times in the event document. For every car in every
+recording, path length, average speed, time between waypoints and how often it got demolished are
+computed. Competitions are spread over a process pool.
+
+Example:
+    python -m analysis.rescore data --out data/analysis.json
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from event_utils.doc_journal import DocumentJournal
+from event_utils.trajectory_recorder import META_FILE, load_car_labels, load_trajectory
+from event_utils.waypoint_tracker import sweep_entry
+from events.waypoint_race import EventDocument, lane_course
+
+# How far apart a re-scored time and the recorded one may be. Game times are recorded as float32,
+# which is only good to a millisecond or so after a few hours of match, and races checked at a reduced
+# rate sweep longer straight lines than the recording does.
+MATCH_TOLERANCE = 1 / 60
+# Roughly how many (row, waypoint) pairs are compared at once, to keep memory bounded on long courses.
+CHUNK_ELEMENTS = 1 << 20
+
+
+def first_crossings(game_time: np.ndarray, location: np.ndarray, is_demolished: np.ndarray,
+                    waypoints: np.ndarray, tolerance: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sweeps the path between consecutive rows against every waypoint, like WaypointRace does between checks.
+    Returns, for each waypoint, the row by which it was reached and the interpolated time it was entered.
+    Waypoints that were never reached get row -1 and time nan. Rows where the car is demolished don't count,
+    and the path restarts from the respawn.
+    """
+    alive = ~is_demolished
+    starts = location.copy()
+    follows_alive = np.zeros(len(location), dtype=bool)
+    follows_alive[1:] = alive[:-1]
+    starts[1:][follows_alive[1:]] = location[:-1][follows_alive[1:]]
+    start_times = game_time.copy()
+    start_times[1:][follows_alive[1:]] = game_time[:-1][follows_alive[1:]]
+
+    rows = np.full(len(waypoints), -1, dtype=np.int64)
+    times = np.full(len(waypoints), np.nan)
+    row = 0
+    while row < len(location):
+        pending = np.flatnonzero(rows < 0)
+        if len(pending) == 0:
+            break
+        chunk = slice(row, row + max(1, CHUNK_ELEMENTS // len(pending)))
+        entry = sweep_entry(starts[chunk, None, :], location[chunk, None, :], waypoints[None, pending, :], tolerance)
+        entry[~alive[chunk]] = np.nan
+        within = ~np.isnan(entry)
+        found = within.any(axis=0)
+        first = within[:, found].argmax(axis=0)
+        fraction = entry[first, np.flatnonzero(found)]
+        rows[pending[found]] = row + first
+        t0, t1 = start_times[chunk][first], game_time[chunk][first]
+        times[pending[found]] = t0 + fraction * (t1 - t0)
+        row = chunk.stop
+    return rows, times
+
+
+def car_stats(game_time: np.ndarray, location: np.ndarray, velocity: np.ndarray,
+              is_demolished: np.ndarray) -> Dict[str, float]:
+    """
+    Statistics over one car's rows. Steps into or out of a demolition are left out of the path length,
+    since the car teleports when it respawns.
+    """
+    if len(game_time) == 0:
+        return {'duration': 0.0, 'path_length': 0.0, 'average_speed': 0.0, 'demolitions': 0,
+                'demolitions_per_minute': 0.0}
+    alive = ~is_demolished
+    steps = np.linalg.norm(np.diff(location, axis=0), axis=1)
+    path_length = float(steps[alive[1:] & alive[:-1]].sum())
+    speeds = np.linalg.norm(velocity[alive], axis=1)
+    demolitions = int(np.count_nonzero(alive[:-1] & is_demolished[1:]))
+    duration = float(game_time[-1] - game_time[0])
+    return {
+        'duration': duration,
+        'path_length': path_length,
+        'average_speed': float(speeds.mean()) if len(speeds) else 0.0,
+        'demolitions': demolitions,
+        'demolitions_per_minute': demolitions * 60 / duration if duration > 0 else 0.0,
+    }
+
+
+def group_spawn_ids(labels: Dict[int, Dict[str, Optional[str]]]) -> Dict[str, List[int]]:
+    """
+    Which spawn ids belong to each competitor, keyed by config path, or by name for cars without one (humans).
+    """
+    groups = defaultdict(list)
+    for spawn_id, info in labels.items():
+        groups[info['config_path'] or info['name']].append(spawn_id)
+    return dict(groups)
+
+
+def rows_of(columns: Dict[str, np.ndarray], spawn_ids: List[int], start_time: float = None,
+            end_time: float = None) -> Dict[str, np.ndarray]:
+    mask = np.isin(columns['spawn_id'], spawn_ids)
+    if start_time is not None:
+        mask &= columns['game_time'] >= start_time
+    if end_time is not None:
+        mask &= columns['game_time'] <= end_time
+    return {
+        'game_time': columns['game_time'][mask].astype(np.float64),
+        'location': columns['location'][mask].astype(np.float64),
+        'velocity': columns['velocity'][mask].astype(np.float64),
+        'is_demolished': np.asarray(columns['is_demolished'][mask]),
+    }
+
+
+def rescore_waypoint_race(doc_path: Path, columns: Dict[str, np.ndarray],
+                          groups: Dict[str, List[int]]) -> Dict[str, Dict]:
+    """
+    Re-scores each competitor that has a run record, from the moment their race started. Competitors
+    without one (documents from before runs were recorded) get overall statistics only.
+    """
+    doc = DocumentJournal(doc_path).load(EventDocument, repair=False)
+    race_spec = doc.race_spec
+    results = {}
+    for key, spawn_ids in groups.items():
+        run = doc.runs.get(key)
+        if run is None:
+            results[key] = {'stats': car_stats(**rows_of(columns, spawn_ids))}
+            continue
+        rows = rows_of(columns, spawn_ids, start_time=run.start_time)
+        _, waypoints = lane_course(race_spec, run.lane_index, doc.heat_size, doc.lane_layout)
+        hit_rows, hit_times = first_crossings(rows['game_time'], rows['location'], rows['is_demolished'],
+                                              waypoints.array, race_spec.waypoint_tolerance)
+        result = {'recorded_time': doc.result_times.get(key), 'rescored_time': None, 'splits': []}
+        if len(hit_rows) and (hit_rows >= 0).all():
+            hit_times = np.sort(hit_times) - run.start_time
+            result['rescored_time'] = float(hit_times[-1])
+            result['splits'] = np.diff(hit_times, prepend=0.0).tolist()
+            finished = hit_rows.max() + 1
+            rows = {name: column[:finished] for name, column in rows.items()}
+        recorded, rescored = result['recorded_time'], result['rescored_time']
+        result['matches'] = (recorded is None and rescored is None) or (
+            recorded is not None and rescored is not None and abs(recorded - rescored) <= MATCH_TOLERANCE)
+        result['stats'] = car_stats(**rows)
+        results[key] = result
+    return results
+
+
+def analyse_competition(competition_dir: Path) -> Dict[str, Dict]:
+    """
+    Analyses every recorded event of one competition. Each recording folder is named after its
+    event document, e.g. WaypointRace.trajectory next to WaypointRace.json. Shards of a sharded event
+    (see headless/shard_coordinator.py) have their own recordings and documents, e.g. WaypointRace.shard0.json,
+    with run records that go by their own arena's clock, so each is scored on its own.
+    """
+    events = {}
+    for trajectory_dir in sorted(competition_dir.glob('*.trajectory')):
+        if not (trajectory_dir / META_FILE).exists():
+            continue
+        columns = load_trajectory(trajectory_dir)
+        groups = group_spawn_ids(load_car_labels(trajectory_dir))
+        doc_path = trajectory_dir.with_suffix('.json')
+        event_type = trajectory_dir.name.split('.')[0]
+        if event_type == 'WaypointRace' and doc_path.exists():
+            events[trajectory_dir.stem] = rescore_waypoint_race(doc_path, columns, groups)
+        else:
+            events[trajectory_dir.stem] = {key: {'stats': car_stats(**rows_of(columns, spawn_ids))}
+                                           for key, spawn_ids in groups.items()}
+    return events
+
+
+def analyse_all(data_dir: Path, workers: int = None) -> Dict[str, Dict]:
+    competition_dirs = sorted(d for d in data_dir.iterdir() if d.is_dir())
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        reports = pool.map(analyse_competition, competition_dirs)
+        return {d.name: report for d, report in zip(competition_dirs, reports) if report}
+
+
+def mismatches(report: Dict[str, Dict]) -> List[str]:
+    lines = []
+    for competition, events in report.items():
+        for event_type, results in events.items():
+            for key, result in results.items():
+                if not result.get('matches', True):
+                    lines.append(f"{competition} {event_type} {key}: recorded {result['recorded_time']}, "
+                                 f"re-scored {result['rescored_time']}")
+    return lines
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('data_dir', nargs='?', type=Path, default=Path(__file__).parent.parent / 'data')
+    parser.add_argument('--out', type=Path, help="Where to write the full report as JSON.")
+    parser.add_argument('--workers', type=int, help="Processes to use, defaults to one per CPU.")
+    args = parser.parse_args(argv)
+
+    report = analyse_all(args.data_dir, args.workers)
+    if args.out:
+        args.out.write_text(json.dumps(report, indent=2))
+    bad = mismatches(report)
+    checked = sum(1 for events in report.values() for results in events.values()
+                  for result in results.values() if 'matches' in result)
+    print(f"Re-scored {checked} runs over {len(report)} competitions, {len(bad)} did not match.")
+    for line in bad:
+        print(line)
+    return 1 if bad else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
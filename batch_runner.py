@@ -0,0 +1,173 @@
+"""
+Runs a queue of competitions back to back without anyone at the keyboard, e.g. for an overnight ladder.
+
+The queue is a JSON list of competitions (see QueuedCompetition):
+[
+  {"name": "ladder-1", "competitor_cfg_files": ["path/to/bot_a.cfg", "path/to/bot_b.cfg"],
+   "events": ["WaypointRace", "DemolitionDerby"], "seed": 1234,
+   "event_options": {"WaypointRace": {"heat_size": 2, "lane_layout": "mirrored"}}},
+  ...
+]
+
+Usage:
+    python batch_runner.py queue.json [output_dir] [--record]
+
+Each competition gets its own folder in output_dir (data/batch/<queue name> by default), and a line in
+results.jsonl as soon as it's done. summary.json lists everything at the end. Running the same queue again
+skips the competitions that completed already, and resumes the one that was cut short. Results also go to
+the results database in data/ (see analysis/leaderboard.py).
+"""
+
+import json
+import random
+import sys
+import time
+import traceback
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from mashumaro import DataClassJSONMixin
+
+from competitor import Competitor
+from event_utils.doc_journal import DocumentJournal
+from event_utils.results_store import DB_FILE, ResultsStore
+from track_and_field import CompetitionDocument, TrackAndField, create_competition, create_event
+from ui.wait_for_press import key_input
+
+RESULTS_FILE = 'results.jsonl'
+SUMMARY_FILE = 'summary.json'
+COMPETITION_FILE = 'competition.json'
+
+
+@dataclass
+class QueuedCompetition(DataClassJSONMixin):
+    name: str
+    competitor_cfg_files: List[str]
+    events: List[str]
+    # Seeds the random course layouts and start positions, so a competition can be set up again identically.
+    seed: Optional[int] = None
+    # Constructor options for the events, by event type (see create_event).
+    event_options: Dict[str, Dict] = field(default_factory=dict)
+
+
+@dataclass
+class CompetitionOutcome(DataClassJSONMixin):
+    name: str
+    directory: str
+    status: str  # 'complete' or 'failed'
+    seconds: float
+    results: Dict[str, Dict]
+    error: Optional[str] = None
+
+
+def event_results(doc: CompetitionDocument) -> Dict[str, Dict]:
+    """
+    The result_* fields of every event document, by event type. Read from disk, because events that were
+    already complete when a competition resumed are never loaded.
+    """
+    results = {}
+    for event_meta in doc.event_documents:
+        state = DocumentJournal(Path(event_meta.event_doc_path)).load_state(repair=False)
+        results[event_meta.event_type] = {k: v for k, v in state.items() if k.startswith('result_')}
+    return results
+
+
+def prepare(queued: QueuedCompetition, competition_dir: Path,
+            event_options: Dict[str, Dict] = None) -> CompetitionDocument:
+    """
+    Sets up the competition's folder, or picks up the document of one that was cut short.
+    event_options apply to every competition, under the competition's own.
+    """
+    doc_file = competition_dir / COMPETITION_FILE
+    if doc_file.exists():
+        return CompetitionDocument.from_json(doc_file.read_text())
+    competitors = Competitor.from_config_paths(queued.competitor_cfg_files)
+    if queued.seed is not None:
+        random.seed(queued.seed)
+    try:
+        events = [create_event(t, **{**(event_options or {}).get(t, {}), **queued.event_options.get(t, {})})
+                  for t in queued.events]
+        doc = create_competition(competitors, events, competition_dir)
+    finally:
+        # Reseeded from the OS, so that whatever comes next (unseeded competitions, spawn ids) doesn't carry on
+        # from a seeded stream.
+        random.seed()
+    doc_file.write_text(doc.to_json())
+    return doc
+
+
+def run_queue(queue: List[QueuedCompetition], output_dir: Path, record_trajectories=False,
+              connect: Callable[[CompetitionDocument], TrackAndField] = None,
+              results_store: ResultsStore = None, event_options: Dict[str, Dict] = None) -> List[CompetitionOutcome]:
+    """
+    :param connect: Makes the script for the first competition, which is reused for the rest.
+    By default that's a TrackAndField connected to the running game.
+    :param results_store: Where every event's results also go as it completes.
+    :param event_options: Event constructor options for every competition, by event type, e.g.
+    headless.kinematic_sim.EVENT_OPTIONS when connecting to simulated arenas.
+    """
+    if connect is None:
+        def connect(doc: CompetitionDocument) -> TrackAndField:
+            return TrackAndField(doc, record_trajectories)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    results_path = output_dir / RESULTS_FILE
+    # The latest outcome of each competition. Failed ones are tried again.
+    outcomes: Dict[str, CompetitionOutcome] = {}
+    if results_path.exists():
+        for line in results_path.read_text().splitlines():
+            if line:
+                outcome = CompetitionOutcome.from_json(line)
+                outcomes[outcome.name] = outcome
+    done = {name for name, outcome in outcomes.items() if outcome.status == 'complete'}
+
+    key_input.unattended = True
+    track_and_field: TrackAndField = None
+    for index, queued in enumerate(queue):
+        if queued.name in done:
+            continue
+        competition_dir = output_dir / f"{index:04d}-{queued.name}"
+        started = time.perf_counter()
+        print(f"Competition {index + 1} / {len(queue)}: {queued.name}")
+        try:
+            doc = prepare(queued, competition_dir, event_options)
+            doc_file = competition_dir / COMPETITION_FILE
+            if track_and_field is None:
+                track_and_field = connect(doc)
+                track_and_field.competition_file = doc_file
+                if results_store is not None:
+                    track_and_field.results_store = results_store
+            else:
+                track_and_field.start_competition(doc, track_and_field.spawn_helper, record_trajectories, doc_file)
+            track_and_field.run_events()
+            outcome = CompetitionOutcome(queued.name, str(competition_dir), 'complete',
+                                         time.perf_counter() - started, event_results(doc))
+        except Exception:
+            traceback.print_exc()
+            outcome = CompetitionOutcome(queued.name, str(competition_dir), 'failed',
+                                         time.perf_counter() - started, {}, error=traceback.format_exc())
+        outcomes[queued.name] = outcome
+        with open(results_path, 'a') as f:
+            f.write(outcome.to_json() + '\n')
+
+    ordered = [outcomes[q.name] for q in queue if q.name in outcomes]
+    (output_dir / SUMMARY_FILE).write_text(json.dumps([o.to_dict() for o in ordered], indent=2))
+    if track_and_field is not None:
+        track_and_field.exit_gracefully()
+    return ordered
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    queue_file = Path(args[0])
+    queue = [QueuedCompetition.from_dict(d) for d in json.loads(queue_file.read_text())]
+    default_dir = Path(__file__).parent / "data" / "batch" / queue_file.stem
+    output_dir = Path(args[1]) if len(args) > 1 else default_dir
+
+    results_store = ResultsStore(Path(__file__).parent / "data" / DB_FILE)
+    outcomes = run_queue(queue, output_dir, record_trajectories='--record' in sys.argv, results_store=results_store)
+    failed = [o.name for o in outcomes if o.status != 'complete']
+    print(f"Ran {len(outcomes)} competitions, {len(failed)} failed. Summary at {output_dir / SUMMARY_FILE}")
+    for name in failed:
+        print(f"Failed: {name}")
+    exit(1 if failed else 0)
@@ -1,5 +1,42 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
 from rlbot.parsing.bot_config_bundle import BotConfigBundle, get_bot_config_bundle
 
+# Parsed bundles by config path, along with the cfg file's mtime when it was parsed. Shared by every event,
+# so a bot's cfg is only parsed again if the file changes.
+_bundle_cache: Dict[str, Tuple[int, BotConfigBundle]] = {}
+_bundle_cache_lock = threading.Lock()
+# Threads used to parse cfg files that aren't cached yet.
+LOAD_WORKERS = 8
+
+
+def load_bundle(path: str) -> BotConfigBundle:
+    """
+    Gets the bundle for a bot cfg file, parsing it only if it isn't cached or has changed since.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    with _bundle_cache_lock:
+        cached = _bundle_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    bundle = get_bot_config_bundle(path)
+    with _bundle_cache_lock:
+        _bundle_cache[path] = (mtime, bundle)
+    return bundle
+
+
+def load_bundles(paths: List[str]) -> List[BotConfigBundle]:
+    """
+    Like load_bundle for many paths at once, with cold parses running in parallel.
+    """
+    if len(paths) <= 1:
+        return [load_bundle(p) for p in paths]
+    with ThreadPoolExecutor(max_workers=min(LOAD_WORKERS, len(paths))) as pool:
+        return list(pool.map(load_bundle, paths))
+
 
 class Competitor:
     """
@@ -11,7 +48,11 @@ class Competitor:
 
     @staticmethod
     def from_config_path(path: str):
-        return Competitor(bundle=get_bot_config_bundle(path))
+        return Competitor(bundle=load_bundle(path))
+
+    @staticmethod
+    def from_config_paths(paths: List[str]) -> List['Competitor']:
+        return [Competitor(bundle=b) for b in load_bundles(paths)]
 
     def name(self):
         return self.bundle.name
@@ -1,13 +1,18 @@
 import math
 from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Union
 
+import numpy as np
 from rlbot.utils.game_state_util import Vector3 as GamestateVector3
 
 from mashumaro import DataClassJSONMixin
+from mashumaro.types import SerializableType
 
 
 @dataclass
 class Vector3(DataClassJSONMixin):
+    # No per-instance dict, since lots of these get made every tick.
+    __slots__ = ('x', 'y', 'z')
     x: float
     y: float
     z: float
@@ -23,9 +28,18 @@ class Vector3(DataClassJSONMixin):
         """Returns the length of the vector. Also called magnitude and norm."""
         return math.sqrt(self.x**2 + self.y**2 + self.z**2)
 
+    def length_sq(self) -> float:
+        """Returns the squared length of the vector, which is cheaper when only comparing lengths."""
+        return self.x * self.x + self.y * self.y + self.z * self.z
+
     def dist(self, other: 'Vector3') -> float:
         """Returns the distance between this vector and another vector using pythagoras."""
-        return (self - other).length()
+        return math.sqrt(self.dist_sq(other))
+
+    def dist_sq(self, other: 'Vector3') -> float:
+        """Returns the squared distance between this vector and another, without making a new vector."""
+        dx, dy, dz = self.x - other.x, self.y - other.y, self.z - other.z
+        return dx * dx + dy * dy + dz * dz
 
     def __getitem__(self, item: int):
         return (self.x, self.y, self.z)[item]
@@ -35,3 +49,58 @@ class Vector3(DataClassJSONMixin):
 
     def __sub__(self, other: 'Vector3') -> 'Vector3':
         return Vector3(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    def __iadd__(self, other: 'Vector3') -> 'Vector3':
+        self.x += other.x
+        self.y += other.y
+        self.z += other.z
+        return self
+
+    def __isub__(self, other: 'Vector3') -> 'Vector3':
+        self.x -= other.x
+        self.y -= other.y
+        self.z -= other.z
+        return self
+
+
+class Vector3Array(SerializableType):
+    """
+    Many vectors held as one (n, 3) float array, for collections like a course's waypoints.
+    It serializes as a list of Vector3, so documents and matchcomms messages look the same as with List[Vector3].
+    """
+    __slots__ = ('array',)
+
+    def __init__(self, vectors: Union['Vector3Array', np.ndarray, Iterable[Vector3]] = ()):
+        if isinstance(vectors, Vector3Array):
+            self.array = vectors.array
+        elif isinstance(vectors, np.ndarray):
+            self.array = vectors.astype(np.float64, copy=False).reshape(-1, 3)
+        else:
+            self.array = np.array([[v.x, v.y, v.z] for v in vectors], dtype=np.float64).reshape(-1, 3)
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    def __iter__(self) -> Iterator[Vector3]:
+        return (Vector3(x, y, z) for x, y, z in self.array.tolist())
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return Vector3Array(self.array[item])
+        return Vector3(*self.array[item].tolist())
+
+    def __array__(self, dtype=None, copy=None):
+        return self.array if dtype is None else self.array.astype(dtype)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Vector3Array) and np.array_equal(self.array, other.array)
+
+    def __repr__(self) -> str:
+        return f"Vector3Array({self.array.tolist()})"
+
+    def _serialize(self) -> List[dict]:
+        return [{'x': x, 'y': y, 'z': z} for x, y, z in self.array.tolist()]
+
+    @classmethod
+    def _deserialize(cls, value: List[dict]) -> 'Vector3Array':
+        return cls(np.array([[v['x'], v['y'], v['z']] for v in value], dtype=np.float64))
@@ -1,4 +1,3 @@
-import math
 from dataclasses import dataclass
 from pathlib import Path
 from typing import List
@@ -18,14 +17,21 @@ from competitor import Competitor
 # in RLBotGUI, start a fake match with the script active, and the script hooks
 # and takes over?
 from data_types.vector3 import Vector3
+from event_utils.packet_view import PacketView
 from event_utils.spawn_helper import SpawnHelper
+from event_utils.state_batcher import GameStateBatcher
+from event_utils.tick_profiler import profiler
 from ui.on_screen_log import OnScreenLog
+from ui.sphere_renderer import sphere_polylines
+from ui.wait_for_press import Prompter
 
 
 @dataclass
 class EventMeta(DataClassJSONMixin):
     event_type: str
     event_doc_path: str
+    # Set once the event is over, so that a restarted competition can skip it without loading its document.
+    is_complete: bool = False
 
 
 @dataclass
@@ -42,10 +48,14 @@ class Event:
         self.spawn_helper: SpawnHelper = None
         self.game_interface: GameInterface = None
         self.renderer: RenderingManager = None
+        self.state_batcher: GameStateBatcher = None
+        # Holds the cars of the packet being ticked, see PacketView.
+        self.packet_view: PacketView = None
         self.on_screen_log: OnScreenLog = None
         self.competitors: List[Competitor] = []
         self.competition_dir: Path = None
         self.event_meta: EventMeta = None
+        self.prompter: Prompter = None
 
     def init_event(self, competitors: List[Competitor], competition_dir: Path) -> EventMeta:
         self.competitors = competitors
@@ -66,14 +76,50 @@ class Event:
         self.spawn_helper = spawn_helper
         self.game_interface = game_interface
         self.renderer = self.game_interface.renderer
+        self.state_batcher = GameStateBatcher(game_interface, lock=spawn_helper.match_lock)
+        self.packet_view = PacketView()
         self.on_screen_log = OnScreenLog(self.renderer, 4, 20, 400, 1, self.renderer.white())
+        self.prompter = Prompter(self.renderer)
         self.event_meta = doc
 
+    def activate(self) -> None:
+        """
+        Runs when this becomes the active event, before its first tick. Every event is loaded when the
+        competition starts, so anything only needed while the event runs, like the competitors' bot configs,
+        is best loaded here.
+        """
+
     def tick_event(self, packet: GameTickPacket) -> EventStatus:
+        """
+        Runs once per packet. Anything worth timing can be wrapped in its own span,
+        e.g. `with profiler.span('waypoints'):`, and will show up in the event's profile.
+        """
         raise NotImplementedError
 
+    def profile_path(self) -> Path:
+        """
+        Where the tick timings of this event are written when it completes, next to the event document.
+        """
+        doc_path = Path(self.event_meta.event_doc_path)
+        return doc_path.with_name(f"{doc_path.stem}.profile.json")
+
+    def trajectory_path(self) -> Path:
+        """
+        Where every car's per-tick physics is recorded when trajectory recording is on, next to the event document.
+        """
+        doc_path = Path(self.event_meta.event_doc_path)
+        return doc_path.with_name(f"{doc_path.stem}.trajectory")
+
+    def wait_for_press(self, key: str, action_description: str) -> bool:
+        """
+        Shows a prompt until the key is pressed, without blocking. Call it every tick with the same arguments;
+        it returns True on the tick the key gets pressed.
+        """
+        return self.prompter.wait_for_press(key, action_description)
+
     def broadcast_to_bots(self, json_text):
-        self.spawn_helper.matchcomms.outgoing_broadcast.put_nowait(json_text)
+        with profiler.span('matchcomms_put'):
+            self.spawn_helper.matchcomms.outgoing_broadcast.put_nowait(json_text)
 
     def is_event_supported(self, bot_name: str, events_supported_by_bot: List[str]):
         event_type = self.event_meta.event_type
@@ -85,23 +131,14 @@ class Event:
             return False
 
     def hide_ball(self):
-        self.game_interface.set_game_state(GameState(ball=BallState(physics=Physics(
+        self.state_batcher.set_game_state(GameState(ball=BallState(physics=Physics(
             location=Vector3GS(0, 0, -500), velocity=Vector3GS(0, 0, 0), angular_velocity=Vector3GS(0, 0, 0)))))
 
     def render_sphere(self, center: Vector3, radius: float, color):
-        num_pts = 16
-
-        equator = [center + Vector3(
-            radius * math.sin(2 * math.pi * i / num_pts),
-            radius * math.cos(2 * math.pi * i / num_pts),
-            0
-        ) for i in range(num_pts + 1)]
-
-        vertical = [center + Vector3(
-            radius * math.sin(2 * math.pi * i / num_pts),
-            0,
-            radius * math.cos(2 * math.pi * i / num_pts)
-        ) for i in range(num_pts + 1)]
-
+        """
+        Draws a single sphere into the render group that's currently open.
+        For many spheres at once, see ui.sphere_renderer.SphereRenderer.
+        """
+        equator, vertical = sphere_polylines((center.x, center.y, center.z), radius)
         self.renderer.draw_polyline_3d(equator, color)
         self.renderer.draw_polyline_3d(vertical, color)
@@ -0,0 +1,117 @@
+"""
+Keeps an event document safe from crashes while results come in one at a time.
+
+Instead of rewriting the whole document for every result, each change is appended to a journal next to it,
+e.g. WaypointRace.journal next to WaypointRace.json, as one line of JSON which is fsync'd before moving on.
+Every so often the journal is compacted: the full document is written to a temporary file and swapped in
+atomically, then the journal is emptied. Loading reads the document and replays the journal on top of it.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Type, TypeVar, Union
+
+from mashumaro import DataClassJSONMixin
+
+# How many journal records to collect before they're folded into the document.
+COMPACT_EVERY = 32
+
+Doc = TypeVar('Doc', bound=DataClassJSONMixin)
+
+
+def merge(target: Dict, patch: Dict):
+    """
+    Applies a patch to a document's dict form. Nested dicts are merged, anything else is replaced.
+    """
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge(target[key], value)
+        else:
+            target[key] = value
+
+
+def write_atomically(path: Path, text: str):
+    """
+    Writes the file in full or not at all, even if the power goes out halfway.
+    """
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class DocumentJournal:
+    def __init__(self, doc_path: Path):
+        self.doc_path = doc_path
+        self.journal_path = doc_path.with_suffix('.journal')
+        self.state: Dict = None
+        self.num_records = 0
+
+    def create(self, doc: Union[DataClassJSONMixin, Dict]):
+        """
+        Writes a brand new document, discarding any journal left over from an earlier one at the same path.
+        """
+        self.state = doc if isinstance(doc, dict) else doc.to_dict()
+        write_atomically(self.doc_path, json.dumps(self.state))
+        if self.journal_path.exists():
+            self.journal_path.unlink()
+        self.num_records = 0
+
+    def load(self, doc_type: Type[Doc], repair=True) -> Doc:
+        """
+        Reads the document and replays the journal on top of it. A record that was only partly written
+        when the program died is skipped, and with repair it's also cut off, so that new records don't
+        get appended onto it.
+        """
+        return doc_type.from_dict(self.load_state(repair))
+
+    def load_state(self, repair=True) -> Dict:
+        """
+        Like load, but gives the document as a plain dict, for code that handles any kind of event document.
+        """
+        self.state = json.loads(self.doc_path.read_text())
+        self.num_records = 0
+        if self.journal_path.exists():
+            with open(self.journal_path, 'rb+' if repair else 'rb') as f:
+                good_length = 0
+                for line in f:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError("Record was cut off")
+                        patch = json.loads(line)
+                    except ValueError:
+                        if repair:
+                            f.truncate(good_length)
+                        break
+                    merge(self.state, patch)
+                    good_length += len(line)
+                    self.num_records += 1
+        return self.state
+
+    def record(self, patch: Dict):
+        """
+        Durably appends a change to the document, e.g. {'result_times': {cfg_path: 12.3}}.
+        """
+        merge(self.state, patch)
+        with open(self.journal_path, 'a') as f:
+            f.write(json.dumps(patch) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.num_records += 1
+        if self.num_records >= COMPACT_EVERY:
+            self.compact()
+
+    def compact(self):
+        """
+        Folds the journal into the document. If the program dies in between, replaying the journal
+        again on the new document gives the same result.
+        """
+        if self.num_records == 0:
+            return
+        write_atomically(self.doc_path, json.dumps(self.state))
+        with open(self.journal_path, 'w') as f:
+            os.fsync(f.fileno())
+        self.num_records = 0
@@ -0,0 +1,101 @@
+from typing import Dict, Optional
+
+from rlbot.utils.game_state_util import CarState, Physics, Vector3 as Vector3GS, GameState
+from rlbot.utils.structures.game_data_struct import GameTickPacket
+from rlbot.utils.structures.game_interface import GameInterface
+
+from data_types.rotator import Rotator
+from data_types.vector3 import Vector3
+from event_utils.state_batcher import GameStateBatcher
+from ui.render_scheduler import render_scheduler, text_2d
+
+
+class EventClock:
+    """
+    Like TimeLord, but for every car in an event at once: one countdown, one release and one chronometer,
+    with all of the frozen cars held in place by a single game state.
+
+    Cars frozen with until_released=True stay put after the countdown, until release() is called for them,
+    e.g. for staggered starts.
+    """
+
+    def __init__(self, game_interface: GameInterface, countdown_seconds=3, state_batcher: GameStateBatcher = None,
+                 resume_at=0.0):
+        """
+        If a state_batcher is given, cars are frozen through it instead of setting game state directly.
+        When an event resumes after being cut short, resume_at is how far into it we were, and the event time
+        carries on from there after the countdown.
+        """
+        self.game_interface = game_interface
+        self.state_setter = state_batcher or game_interface
+        self.scheduler = render_scheduler(game_interface.renderer)
+        self.countdown_seconds = countdown_seconds
+        self.resume_at = resume_at
+        self.countdown_start_time: float = None
+        self.event_start_time: float = None
+        self.is_released = False
+        self.done_animating = False
+        self.render_group = "countdown"
+        # Packet index -> the state holding the car at its start.
+        self.frozen: Dict[int, CarState] = {}
+        self.held_until_released = set()
+        # Built again only when the frozen cars change, so holding them costs the same every tick.
+        self.freeze_state: Optional[GameState] = None
+
+    def freeze(self, packet_index: int, position: Vector3, rotation: Rotator, until_released=False):
+        self.frozen[packet_index] = CarState(
+            physics=Physics(
+                location=position.to_gamestate(),
+                rotation=rotation.to_gamestate(),
+                velocity=Vector3GS(0, 0, 0),
+                angular_velocity=Vector3GS(0, 0, 0)
+            ),
+            boost_amount=100
+        )
+        if until_released:
+            self.held_until_released.add(packet_index)
+        self.freeze_state = None
+
+    def release(self, packet_index: int):
+        self.frozen.pop(packet_index, None)
+        self.held_until_released.discard(packet_index)
+        self.freeze_state = None
+
+    def get_event_elapsed_time(self, packet: GameTickPacket):
+        return packet.game_info.seconds_elapsed - self.event_start_time
+
+    def tick(self, packet: GameTickPacket):
+        if self.countdown_start_time is None:
+            self.countdown_start_time = packet.game_info.seconds_elapsed
+            self.event_start_time = self.countdown_start_time + self.countdown_seconds - self.resume_at
+
+        countdown_elapsed = packet.game_info.seconds_elapsed - self.countdown_start_time
+        if countdown_elapsed < self.countdown_seconds:
+            self.render_text(str(self.countdown_seconds - int(countdown_elapsed)))
+        elif not self.is_released:
+            self.is_released = True
+            for packet_index in set(self.frozen) - self.held_until_released:
+                self.release(packet_index)
+        if self.is_released:
+            if countdown_elapsed < self.countdown_seconds + 1:
+                self.render_text("GO")
+            elif not self.done_animating:
+                self.scheduler.clear(self.render_group)
+                self.done_animating = True
+
+        if self.frozen:
+            if self.freeze_state is None:
+                self.freeze_state = GameState(cars=dict(self.frozen))
+            self.state_setter.set_game_state(self.freeze_state)
+
+        if countdown_elapsed > self.countdown_seconds:
+            event_elapsed = self.get_event_elapsed_time(packet)
+            renderer = self.game_interface.renderer
+            self.scheduler.show("chronometer", text_2d(300, 350, 3, f"{event_elapsed:.3f}", renderer.lime()))
+
+    def cleanup(self):
+        self.scheduler.clear("chronometer")
+        self.scheduler.clear(self.render_group)
+
+    def render_text(self, text):
+        self.scheduler.show(self.render_group, text_2d(300, 300, 3, text, self.game_interface.renderer.yellow()))
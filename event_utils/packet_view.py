@@ -0,0 +1,53 @@
+import ctypes
+
+import numpy as np
+from rlbot.utils.structures.game_data_struct import GameTickPacket, PlayerInfo, ScoreInfo
+
+# A numpy view of the packet's car structs, so a whole tick is copied at once. This is the one place the layout is
+# described; the trajectory recorder and the kinematic simulation use it too.
+PACKET_CAR_DTYPE = np.dtype({
+    'names': ['physics', 'demolitions', 'is_demolished', 'has_wheel_contact', 'is_super_sonic', 'is_bot', 'boost',
+              'spawn_id', 'team'],
+    'formats': [('<f4', (4, 3)), '<i4', '?', '?', '?', '?', '<i4', '<i4', 'u1'],
+    'offsets': [PlayerInfo.physics.offset, PlayerInfo.score_info.offset + ScoreInfo.demolitions.offset,
+                PlayerInfo.is_demolished.offset, PlayerInfo.has_wheel_contact.offset, PlayerInfo.is_super_sonic.offset,
+                PlayerInfo.is_bot.offset, PlayerInfo.boost.offset, PlayerInfo.spawn_id.offset, PlayerInfo.team.offset],
+    'itemsize': ctypes.sizeof(PlayerInfo)})
+
+
+class PacketView:
+    """
+    The cars of the latest packet as numpy arrays, indexed like packet.game_cars. Copying everything out of the
+    ctypes structs once per tick is much cheaper than reading struct fields car by car, e.g.
+    `view.is_demolished[indices]` instead of `packet.game_cars[i].is_demolished` in a loop.
+    """
+
+    def __init__(self):
+        self.game_time = 0.0
+        self.num_cars = 0
+        self.location = np.zeros((0, 3))
+        self.rotation = np.zeros((0, 3))
+        self.velocity = np.zeros((0, 3))
+        self.angular_velocity = np.zeros((0, 3))
+        self.is_demolished = np.zeros(0, dtype=bool)
+        self.is_bot = np.zeros(0, dtype=bool)
+        self.boost = np.zeros(0, dtype=np.int32)
+        self.demolitions = np.zeros(0, dtype=np.int32)
+        self.spawn_id = np.zeros(0, dtype=np.int32)
+        self.team = np.zeros(0, dtype=np.uint8)
+
+    def update(self, packet: GameTickPacket):
+        self.game_time = packet.game_info.seconds_elapsed
+        self.num_cars = packet.num_cars
+        cars = np.frombuffer(packet.game_cars, dtype=PACKET_CAR_DTYPE, count=packet.num_cars)
+        physics = cars['physics'].astype(np.float64)
+        self.location = physics[:, 0]
+        self.rotation = physics[:, 1]
+        self.velocity = physics[:, 2]
+        self.angular_velocity = physics[:, 3]
+        self.is_demolished = cars['is_demolished'].copy()
+        self.is_bot = cars['is_bot'].copy()
+        self.boost = cars['boost'].copy()
+        self.demolitions = cars['demolitions'].copy()
+        self.team = cars['team'].copy()
+        self.spawn_id = cars['spawn_id'].copy()
@@ -0,0 +1,155 @@
+"""
+Keeps the results of every event in one SQLite database, so leaderboards don't have to read every
+competition folder. Events are added as they complete, and older competition folders can be backfilled
+(see analysis/leaderboard.py).
+
+A bot is identified by its config path, like in the event documents. Events on the same course, e.g.
+WaypointRaces with the same race_spec, share a course key.
+"""
+
+import hashlib
+import json
+import math
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from event_utils.doc_journal import DocumentJournal
+
+
+class ResultKind(NamedTuple):
+    field: str
+    higher_is_better: bool
+    # The part of the document that decides the course, if there is one.
+    course_field: Optional[str]
+
+
+# The database's file name in the data folder.
+DB_FILE = 'results.sqlite'
+
+# Event type -> where its results are. Event documents are named after their event type, e.g. WaypointRace.json.
+RESULT_KINDS: Dict[str, ResultKind] = {
+    'WaypointRace': ResultKind('result_times', False, 'race_spec'),
+    'DemolitionDerby': ResultKind('result_demolitions', True, None),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    doc_path TEXT NOT NULL UNIQUE,
+    competition_dir TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    course_key TEXT,
+    higher_is_better INTEGER NOT NULL,
+    completed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    event_id INTEGER NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+    bot TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (event_id, bot)
+);
+CREATE INDEX IF NOT EXISTS results_by_bot ON results (bot, event_id);
+CREATE INDEX IF NOT EXISTS events_by_course ON events (event_type, course_key);
+"""
+
+# Each result ranked within its event, best first, with how many took part.
+RANKED = """
+SELECT r.event_id, r.bot, r.value, e.event_type, e.course_key, e.competition_dir, e.completed_at,
+       RANK() OVER (PARTITION BY r.event_id
+                    ORDER BY CASE WHEN e.higher_is_better THEN -r.value ELSE r.value END) AS rank,
+       COUNT(*) OVER (PARTITION BY r.event_id) AS entrants
+FROM results r JOIN events e ON e.id = r.event_id
+"""
+
+
+def course_key(state: Dict, kind: ResultKind) -> Optional[str]:
+    if kind.course_field is None or kind.course_field not in state:
+        return None
+    spec = json.dumps(state[kind.course_field], sort_keys=True)
+    return hashlib.sha1(spec.encode()).hexdigest()[:16]
+
+
+class ResultsStore:
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(db_path))
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def ingest(self, event_type: str, doc_path: Path, completed_at: float = None) -> int:
+        """
+        Adds or replaces the results of one event document. Returns how many results it had.
+        """
+        # Documents are known by their absolute path, however they were found.
+        doc_path = Path(doc_path).resolve()
+        kind = RESULT_KINDS.get(event_type)
+        if kind is None:
+            return 0
+        state = DocumentJournal(doc_path).load_state(repair=False)
+        results = {bot: value for bot, value in state.get(kind.field, {}).items()
+                   if isinstance(value, (int, float)) and math.isfinite(value)}
+        with self.connection:
+            self.connection.execute("DELETE FROM events WHERE doc_path = ?", (str(doc_path),))
+            cursor = self.connection.execute(
+                "INSERT INTO events (doc_path, competition_dir, event_type, course_key, higher_is_better, "
+                "completed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (str(doc_path), str(doc_path.parent), event_type, course_key(state, kind), kind.higher_is_better,
+                 completed_at if completed_at is not None else time.time()))
+            self.connection.executemany("INSERT INTO results (event_id, bot, value) VALUES (?, ?, ?)",
+                                        [(cursor.lastrowid, bot, value) for bot, value in results.items()])
+        return len(results)
+
+    def backfill(self, data_dir: Path) -> int:
+        """
+        Ingests every event document in the competition folders under data_dir, at any depth. Returns how
+        many documents were ingested.
+        """
+        count = 0
+        for doc_path in sorted(p.resolve() for p in iter_event_documents(data_dir)):
+            self.ingest(doc_path.stem, doc_path, completed_at=doc_path.stat().st_mtime)
+            count += 1
+        return count
+
+    def bot_history(self, bot: str) -> List[sqlite3.Row]:
+        """
+        Every result of the bot, oldest first, with its rank in the event.
+        """
+        # Only the bot's own events need ranking.
+        return self.connection.execute(
+            f"SELECT * FROM ({RANKED} WHERE r.event_id IN (SELECT event_id FROM results WHERE bot = ?)) "
+            f"WHERE bot = ? ORDER BY completed_at", (bot, bot)).fetchall()
+
+    def best_times(self, course: str = None) -> List[sqlite3.Row]:
+        """
+        Every bot's best WaypointRace time on each course, fastest first.
+        """
+        return self.connection.execute(
+            "SELECT e.course_key, r.bot, MIN(r.value) AS best, COUNT(*) AS runs "
+            "FROM results r JOIN events e ON e.id = r.event_id "
+            "WHERE e.event_type = 'WaypointRace' AND (? IS NULL OR e.course_key = ?) "
+            "GROUP BY e.course_key, r.bot ORDER BY e.course_key, best", (course, course)).fetchall()
+
+    def standings(self, event_type: str = None) -> List[sqlite3.Row]:
+        """
+        Overall standings by points: every event is worth one point per entrant that a bot beat.
+        """
+        return self.connection.execute(
+            f"SELECT bot, SUM(entrants - rank) AS points, COUNT(*) AS events, SUM(rank = 1) AS wins "
+            f"FROM ({RANKED}) WHERE ? IS NULL OR event_type = ? "
+            f"GROUP BY bot ORDER BY points DESC, wins DESC, bot", (event_type, event_type)).fetchall()
+
+
+def iter_event_documents(data_dir: Path) -> Iterator[Path]:
+    """
+    Event documents are named after their event type. Shard copies (e.g. WaypointRace.shard0.json) aren't
+    included, their results are merged into the main document.
+    """
+    for event_type in RESULT_KINDS:
+        yield from data_dir.rglob(f"{event_type}.json")
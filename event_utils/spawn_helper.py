@@ -1,16 +1,31 @@
 import queue
+import threading
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from random import randint
-from typing import List
+from typing import Callable, Dict, List, Optional
 
 from rlbot.matchcomms.client import MatchcommsClient
 from rlbot.matchconfig.match_config import EmptyPlayerSlot, PlayerConfig, MatchConfig, MutatorConfig
 from rlbot.parsing.bot_config_bundle import BotConfigBundle
 from rlbot.setup_manager import SetupManager
+from rlbot.utils.game_state_util import GameState, CarState, Physics, Vector3, Rotator
 from rlbot.utils.structures.game_data_struct import GameTickPacket
 from rlbot.utils.structures.game_interface import GameInterface
 
+from event_utils.tick_profiler import profiler
+
+# Upper bounds on how long to wait for the game and the bots. Spawning moves on as soon as things are ready.
+SPAWN_TIMEOUT = 10
+METADATA_TIMEOUT = 10
+DESPAWN_TIMEOUT = 5
+POLL_INTERVAL = 0.02
+# Parked cars keep their processes warm, but still cost CPU. Past this many cars in the match,
+# the next acquire starts over from an empty match instead of spawning more.
+POOL_CAPACITY = 8
+# How long to wait for ready messages from a batch of freshly spawned bots, all together.
+READY_TIMEOUT = 7
+
 
 @dataclass
 class ActiveBot:
@@ -26,6 +41,38 @@ class CompletedSpawn:
     packet_index: int
 
 
+@dataclass
+class PooledBot:
+    """
+    A spawned bot that is either in use by an event or parked out of the way, waiting to be used again.
+    """
+    spawn: CompletedSpawn
+    handshake_done: bool = False
+    supported_events: List[str] = field(default_factory=list)
+
+    @property
+    def config_path(self) -> str:
+        return self.spawn.bot.bundle.config_path
+
+
+@dataclass
+class ReadinessReport:
+    """
+    What a batch of bots said when they started up.
+    """
+    supported_events: Dict[int, List[str]]  # By spawn_id, for every bot we heard from.
+    stragglers: List[ActiveBot]  # Bots we never heard from before the deadline.
+    anonymous: List[List[str]]  # Ready messages that didn't say which bot sent them, and couldn't be worked out.
+
+
+def parking_spot(slot: int) -> Physics:
+    """
+    Parked cars hang still in a row near the ceiling, away from anything events do on the ground.
+    """
+    return Physics(location=Vector3(-3000 + 250 * slot, 0, 1900), rotation=Rotator(0, 0, 0),
+                   velocity=Vector3(0, 0, 0), angular_velocity=Vector3(0, 0, 0))
+
+
 def player_config_from_active_bot(active_bot: ActiveBot):
     if active_bot is None:
         return EmptyPlayerSlot()
@@ -56,6 +103,18 @@ def build_match_config(active_bots: List[ActiveBot]):
     return match_config
 
 
+def wait_until(condition: Callable[[], bool], timeout: float, poll_interval: float = POLL_INTERVAL) -> bool:
+    """
+    Polls the condition until it holds or the timeout runs out. Returns whether it held.
+    """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(poll_interval)
+    return True
+
+
 def index_from_spawn_id(packet: GameTickPacket, spawn_id: int):
     for n in range(0, packet.num_cars):
         packet_spawn_id = packet.game_cars[n].spawn_id
@@ -68,6 +127,15 @@ class SpawnHelper:
 
     def __init__(self, game_interface: GameInterface):
         self.active_bots: List[ActiveBot] = []
+        self.spawn_indices: Dict[int, int] = {}
+        self.parked: List[PooledBot] = []
+        self.in_use: List[PooledBot] = []
+        # Guards the pool and active_bots. Only ever held briefly, since park_idle needs it every tick.
+        self.lock = threading.RLock()
+        # Guards changes to the match through the game interface (starting matches, setting game state), which
+        # may come from the prespawn thread and the tick loop at once. Reading packets is safe from any thread.
+        self.match_lock = threading.Lock()
+        self.prespawn_thread: Optional[threading.Thread] = None
         self.setup_manager = SetupManager()
         self.setup_manager.game_interface = game_interface
         self.setup_manager.num_participants = 0
@@ -75,9 +143,9 @@ class SpawnHelper:
         self.matchcomms = MatchcommsClient(
             self.setup_manager.matchcomms_server.root_url)  # This must come after launch_bot_processes
 
-    def _make_active_bot(self, bundle: BotConfigBundle, team: int):
+    def _make_active_bot(self, bundle: BotConfigBundle, team: int, also_taken: List[ActiveBot] = ()):
         name = bundle.name
-        names = set([ab.name for ab in self.active_bots if ab is not None])
+        names = set([ab.name for ab in self.active_bots + list(also_taken) if ab is not None])
         unique_name = name[:31]
         count = 2
         while unique_name in names:
@@ -86,23 +154,155 @@ class SpawnHelper:
 
         return ActiveBot(unique_name, team, randint(1, 2 ** 31 - 1), bundle)
 
-    def spawn_bots(self, bundles: List[BotConfigBundle]) -> List[CompletedSpawn]:
-        new_active_bots = [self._make_active_bot(bundle, 0) for bundle in bundles]
-        self.active_bots += new_active_bots
-        match_config = build_match_config(self.active_bots)
-        self.launch_match(match_config)
-        packet = GameTickPacket()
-        self.setup_manager.game_interface.update_live_data_packet(packet)
-        return [CompletedSpawn(
-            bot=active_bot,
-            packet_index=index_from_spawn_id(packet, active_bot.spawn_id)
-        ) for active_bot in new_active_bots]
+    def _make_active_bots(self, bundles: List[BotConfigBundle], team: int) -> List[ActiveBot]:
+        new_active_bots = []
+        for bundle in bundles:
+            new_active_bots.append(self._make_active_bot(bundle, team, also_taken=new_active_bots))
+        return new_active_bots
+
+    def acquire(self, bundles: List[BotConfigBundle], exclusive=False) -> List[PooledBot]:
+        """
+        Gets a bot for each bundle, preferring parked bots with the same config so their processes don't have to
+        cold start. The rest are spawned. Cars never leave the match one at a time, because bots retire when
+        their packet index changes; when the match is full, or when exclusive is set and other bots are parked,
+        everything is cleared first.
+
+        Bots whose handshake_done is False have yet to have their ready message read from matchcomms.
+        """
+        self.finish_prespawn()
+        with self.lock:
+            parked = list(self.parked)
+            reused = []
+            for bundle in bundles:
+                match = next((p for p in parked if p.config_path == bundle.config_path), None)
+                if match is not None:
+                    parked.remove(match)
+                reused.append(match)
+            missing = [bundle for bundle, pooled in zip(bundles, reused) if pooled is None]
+
+            too_full = len(self.active_bots) + len(missing) > max(POOL_CAPACITY, len(bundles))
+            if (exclusive and parked) or (missing and too_full and not self.in_use):
+                self.clear_bots()
+                return self.acquire(bundles)
+
+            spawns = []
+            if missing:
+                with profiler.span('spawn_bots'):
+                    spawns = self.spawn_bots(missing)
+            profiler.count('bots_reused', len(bundles) - len(missing))
+            fresh = iter([PooledBot(spawn) for spawn in spawns])
+            acquired = [pooled if pooled is not None else next(fresh) for pooled in reused]
+            self.parked = [p for p in self.parked if p not in acquired]
+            self.in_use += acquired
+            return acquired
+
+    def release(self, pooled_bots: List[PooledBot]):
+        """
+        Parks bots that an event is done with, so they can be acquired again later.
+        """
+        with self.lock:
+            for pooled in pooled_bots:
+                if pooled in self.in_use:
+                    self.in_use.remove(pooled)
+                    self.parked.append(pooled)
+
+    def prespawn(self, bundles: List[BotConfigBundle]):
+        """
+        Starts spawning bots in the background and parks them, so a later acquire finds them warm.
+        Skipped when it would take the match past POOL_CAPACITY.
+
+        Everything else that drives the setup manager (acquire, prespawn, clear_bots) waits for the background
+        spawn to finish first, so it's only ever used by one thread at a time.
+        """
+        self.finish_prespawn()
+        parked_paths = [p.config_path for p in self.parked]
+        bundles = [b for b in bundles if b.config_path not in parked_paths]
+        if not bundles or len(self.active_bots) + len(bundles) > POOL_CAPACITY:
+            return
+
+        def spawn_and_park():
+            self.spawn_bots(bundles, park=True)
+
+        self.prespawn_thread = threading.Thread(target=spawn_and_park, daemon=True)
+        self.prespawn_thread.start()
+
+    def finish_prespawn(self):
+        if self.prespawn_thread is not None:
+            self.prespawn_thread.join()
+            self.prespawn_thread = None
+
+    def park_idle(self, state_setter):
+        """
+        Holds every parked car at its parking spot. state_setter is anything with a set_game_state method.
+        """
+        with self.lock:
+            cars = {p.spawn.packet_index: CarState(physics=parking_spot(slot), boost_amount=0)
+                    for slot, p in enumerate(self.parked) if p.spawn.packet_index is not None}
+        if cars:
+            state_setter.set_game_state(GameState(cars=cars))
+
+    def reset_pool(self):
+        self.parked = []
+        self.in_use = []
+
+    def spawn_bots(self, bundles: List[BotConfigBundle], park=False) -> List[CompletedSpawn]:
+        """
+        With park set, the new cars are parked as soon as they show up in the packet, rather than left
+        at their kickoff spots while their bot processes start.
+        """
+        with self.lock:
+            new_active_bots = self._make_active_bots(bundles, 0)
+            self.active_bots = self.active_bots + new_active_bots
+            match_config = build_match_config(self.active_bots)
+        spawns = [CompletedSpawn(bot=active_bot, packet_index=None) for active_bot in new_active_bots]
+
+        def on_spawned():
+            for spawn in spawns:
+                spawn.packet_index = self.spawn_indices.get(spawn.bot.spawn_id)
+            if park:
+                with self.lock:
+                    self.parked += [PooledBot(spawn) for spawn in spawns]
+
+        # Waiting for the cars and bot processes to show up takes a while, and mustn't hold up park_idle.
+        self.launch_match(match_config, on_spawned)
+        return spawns
+
+    def refresh_spawn_indices(self, packet: GameTickPacket = None) -> GameTickPacket:
+        """
+        Updates the spawn_id -> packet index map, from the given packet or a fresh one.
+        """
+        if packet is None:
+            packet = GameTickPacket()
+            self.setup_manager.game_interface.update_live_data_packet(packet)
+        self.spawn_indices = {packet.game_cars[n].spawn_id: n for n in range(packet.num_cars)}
+        return packet
+
+    def are_spawned(self, spawn_ids: List[int]) -> bool:
+        self.refresh_spawn_indices()
+        return all(spawn_id in self.spawn_indices for spawn_id in spawn_ids)
+
+    def wait_for_agent_metadata(self, indices: List[int]) -> bool:
+        """
+        Waits until every bot at the given packet indices has sent its agent metadata.
+        Gives up early if one of their processes dies, since it never will.
+        """
+        processes = self.setup_manager.bot_processes
+        metadata = self.setup_manager.agent_metadata_map
+
+        def ready():
+            self.setup_manager.try_recieve_agent_metadata()  # Blocks briefly while the queue is empty.
+            if any(i in processes and not processes[i].is_alive() for i in indices):
+                print("A bot process died before sending its agent metadata.")
+                return True
+            return all(i in metadata for i in indices)
+
+        return wait_until(ready, METADATA_TIMEOUT, poll_interval=0)
 
     def listen_for_events_supported_by_bot(self, timeout: int = 7) -> List[str]:
         """
         Bots which support Track and Field should please send a message to matchcomms
         when they start up, shaped like this:
-        { "readyForTrackAndField": True, "supportedEvents": ["WaypointRace", "etc"] }
+        { "readyForTrackAndField": True, "supportedEvents": ["WaypointRace", "etc"], "spawn_id": 1234 }
 
         If they don't send it, we'll assume they don't support any. The event itself
         will choose whether such bots can still try to participate.
@@ -119,15 +319,94 @@ class SpawnHelper:
             print(f"Bot never sent a 'ready' message, proceeding anyway.")
         return supported_events
 
+    def collect_ready_messages(self, bots: List[ActiveBot], timeout: float = READY_TIMEOUT) -> ReadinessReport:
+        """
+        Waits for ready messages from all of the given bots at once, under a single deadline.
+        See listen_for_events_supported_by_bot for the shape of the message. A message is matched to its bot
+        by a "spawn_id" or "name" field. Messages with neither are attributed by elimination when only one
+        bot is left to hear from; otherwise they are reported as anonymous.
+        """
+        outstanding = {bot.spawn_id: bot for bot in bots}
+        by_name = {bot.name: bot.spawn_id for bot in bots}
+        supported_events: Dict[int, List[str]] = {}
+        anonymous: List[List[str]] = []
+        deadline = time.monotonic() + timeout
+
+        while len(outstanding) > len(anonymous):
+            try:
+                message = self.matchcomms.incoming_broadcast.get(
+                    block=True, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if not message.get("readyForTrackAndField", False):
+                continue
+            spawn_id = message.get("spawn_id", by_name.get(message.get("name")))
+            events = message.get("supportedEvents", [])
+            if spawn_id in outstanding:
+                supported_events[spawn_id] = events
+                del outstanding[spawn_id]
+            else:
+                anonymous.append(events)
+
+        if len(outstanding) == 1 and len(anonymous) == 1:
+            supported_events[next(iter(outstanding))] = anonymous.pop()
+            outstanding.clear()
+
+        stragglers = list(outstanding.values())
+        for bot in stragglers:
+            print(f"{bot.name} never sent a 'ready' message, proceeding anyway.")
+        return ReadinessReport(supported_events=supported_events, stragglers=stragglers, anonymous=anonymous)
+
+    def handshake(self, pooled_bots: List[PooledBot], timeout: float = READY_TIMEOUT) -> ReadinessReport:
+        """
+        Collects ready messages from those of the bots which haven't sent one yet, and remembers
+        what each of them supports. Bots reused from the pool answer straight away from memory.
+        """
+        awaiting = [pooled for pooled in pooled_bots if not pooled.handshake_done]
+        with profiler.span('handshake'):
+            report = self.collect_ready_messages([pooled.spawn.bot for pooled in awaiting], timeout)
+        for pooled in awaiting:
+            pooled.handshake_done = True
+            pooled.supported_events = report.supported_events.get(pooled.spawn.bot.spawn_id, [])
+        return report
+
     def clear_bots(self):
-        self.active_bots = []
+        self.finish_prespawn()
+        with self.lock:
+            self.active_bots = []
+            self.reset_pool()
         match_config = build_match_config(self.active_bots)
         self.launch_match(match_config)
+        # Bots retire by themselves once their car disappears from the packet.
+        processes = self.setup_manager.bot_processes
+        if not wait_until(lambda: not any(p.is_alive() for p in processes.values()), DESPAWN_TIMEOUT):
+            print(f"Some bot processes are still running after {DESPAWN_TIMEOUT} seconds, proceeding anyway.")
+
+    def launch_match(self, match_config: MatchConfig, on_spawned: Callable[[], None] = None):
+        """
+        Starts the match with the given bots, and waits for their cars and processes. on_spawned is called once
+        the cars are in the packet, before waiting for the processes.
+        """
+        # Hands over the bundles we already have, or every spawn would parse every bot's cfg again. Launching a new
+        # bot's process still parses its cfg once, inside rlbot.
+        bundles = {i: ab.bundle for i, ab in enumerate(self.active_bots) if ab is not None}
+        with self.match_lock:
+            self.setup_manager.load_match_config(match_config, bot_config_overrides=bundles)
+            self.setup_manager.start_match()
+        spawn_ids = [ab.spawn_id for ab in self.active_bots if ab is not None]
+        if not wait_until(lambda: self.are_spawned(spawn_ids), SPAWN_TIMEOUT):
+            print(f"Not every car showed up in the packet after {SPAWN_TIMEOUT} seconds, proceeding anyway.")
+        if on_spawned is not None:
+            on_spawned()
+
+        # Metadata left over from a previous bot at the same index would make it look like the new one is ready.
+        indices = [self.spawn_indices[s] for s in spawn_ids if s in self.spawn_indices]
+        processes = self.setup_manager.bot_processes
+        for i in indices:
+            if i not in processes or not processes[i].is_alive():
+                self.setup_manager.agent_metadata_map.pop(i, None)
 
-    def launch_match(self, match_config: MatchConfig):
-        self.setup_manager.load_match_config(match_config)
-        self.setup_manager.start_match()
         self.setup_manager.launch_bot_processes(match_config=match_config)
-        time.sleep(1)  # Give a chance for the agent metadata to arrive
-        num_received = self.setup_manager.try_recieve_agent_metadata()
-        print(f"Got {num_received} agent metadata objects.")
+        if not self.wait_for_agent_metadata(indices):
+            print(f"Not every bot sent its agent metadata after {METADATA_TIMEOUT} seconds, proceeding anyway.")
+        print(f"Have agent metadata for {len(self.setup_manager.agent_metadata_map)} bots.")
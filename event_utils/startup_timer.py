@@ -0,0 +1,45 @@
+import json
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict
+
+
+class StartupTimer:
+    """
+    Times the phases of getting a competition going, from the script's first import until the first event
+    is about to run. RLBotGUI restarts the script a lot, so this is worth keeping short.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def report(self) -> dict:
+        return {
+            "phases": dict(self.phases),
+            "total": time.perf_counter() - self.started,
+        }
+
+    def summary(self) -> str:
+        report = self.report()
+        phases = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in report["phases"].items())
+        return f"Started up in {report['total']:.2f}s: {phases}"
+
+    def write_report(self, path: Path):
+        path.write_text(json.dumps(self.report(), indent=2))
+
+
+# Shared by everything in the script. Created on first import, which is about when the script starts.
+startup = StartupTimer()
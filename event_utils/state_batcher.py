@@ -0,0 +1,135 @@
+from contextlib import nullcontext
+from threading import Lock
+from typing import Dict, Optional
+
+from rlbot.utils.game_state_util import GameState, CarState, BallState, GameInfoState, Physics, Vector3, Rotator
+from rlbot.utils.structures.game_data_struct import GameTickPacket
+from rlbot.utils.structures.game_interface import GameInterface
+
+from event_utils.tick_profiler import profiler
+
+VECTOR_FIELDS = ('x', 'y', 'z')
+ROTATOR_FIELDS = ('pitch', 'yaw', 'roll')
+# How close the packet must be to a desired value for setting it again to count as a no-op.
+LOCATION_TOLERANCE = 1.0
+VELOCITY_TOLERANCE = 1.0
+ROTATION_TOLERANCE = 0.01
+
+
+def merge_components(old, new, cls, fields):
+    if old is None:
+        return new
+    if new is None:
+        return old
+    return cls(**{f: getattr(new, f) if getattr(new, f) is not None else getattr(old, f) for f in fields})
+
+
+def merge_physics(old: Optional[Physics], new: Optional[Physics]) -> Optional[Physics]:
+    if old is None:
+        return new
+    if new is None:
+        return old
+    return Physics(
+        location=merge_components(old.location, new.location, Vector3, VECTOR_FIELDS),
+        rotation=merge_components(old.rotation, new.rotation, Rotator, ROTATOR_FIELDS),
+        velocity=merge_components(old.velocity, new.velocity, Vector3, VECTOR_FIELDS),
+        angular_velocity=merge_components(old.angular_velocity, new.angular_velocity, Vector3, VECTOR_FIELDS))
+
+
+def merge_car_states(old: Optional[CarState], new: CarState) -> CarState:
+    if old is None:
+        return new
+    return CarState(
+        physics=merge_physics(old.physics, new.physics),
+        boost_amount=new.boost_amount if new.boost_amount is not None else old.boost_amount,
+        jumped=new.jumped if new.jumped is not None else old.jumped,
+        double_jumped=new.double_jumped if new.double_jumped is not None else old.double_jumped)
+
+
+def components_match(actual, desired, fields, tolerance: float) -> bool:
+    if desired is None:
+        return True
+    return all(getattr(desired, f) is None or abs(getattr(actual, f) - getattr(desired, f)) <= tolerance
+               for f in fields)
+
+
+def physics_matches(actual, desired: Optional[Physics]) -> bool:
+    """
+    Whether a packet Physics struct already has every value that the desired physics would set.
+    """
+    if desired is None:
+        return True
+    return (components_match(actual.location, desired.location, VECTOR_FIELDS, LOCATION_TOLERANCE) and
+            components_match(actual.rotation, desired.rotation, ROTATOR_FIELDS, ROTATION_TOLERANCE) and
+            components_match(actual.velocity, desired.velocity, VECTOR_FIELDS, VELOCITY_TOLERANCE) and
+            components_match(actual.angular_velocity, desired.angular_velocity, VECTOR_FIELDS, VELOCITY_TOLERANCE))
+
+
+def car_matches(car, desired: CarState) -> bool:
+    if desired.jumped is not None or desired.double_jumped is not None:
+        return False
+    if desired.boost_amount is not None and int(desired.boost_amount) != car.boost:
+        return False
+    return physics_matches(car.physics, desired.physics)
+
+
+class GameStateBatcher:
+    """
+    Collects the desired game states that events, TimeLords etc. ask for during a tick, and sends them to the game
+    as a single GameState when the tick is flushed. Later requests win field by field, and anything the packet
+    already shows (e.g. a dead car that is already parked at its hiding spot) is left out.
+
+    It has the same set_game_state method as GameInterface, so it can be handed to anything that only sets state.
+    """
+
+    def __init__(self, game_interface: GameInterface, lock: Lock = None):
+        """
+        If a lock is given, it's held while the game state is sent, e.g. SpawnHelper.match_lock so that
+        states don't go out while a background spawn is starting the match.
+        """
+        self.game_interface = game_interface
+        self.lock = lock or nullcontext()
+        self.cars: Dict[int, CarState] = {}
+        self.ball: Optional[BallState] = None
+        self.game_info: Optional[GameInfoState] = None
+        self.states_sent = 0
+        self.states_suppressed = 0
+
+    def set_game_state(self, game_state: GameState):
+        if game_state.cars is not None:
+            for index, car_state in game_state.cars.items():
+                if index is not None:
+                    self.cars[index] = merge_car_states(self.cars.get(index), car_state)
+        if game_state.ball is not None:
+            physics = merge_physics(self.ball.physics if self.ball else None, game_state.ball.physics)
+            self.ball = BallState(physics=physics)
+        if game_state.game_info is not None:
+            self.game_info = merge_components(self.game_info, game_state.game_info, GameInfoState,
+                                              ('world_gravity_z', 'game_speed', 'paused', 'end_match'))
+
+    def flush(self, packet: GameTickPacket = None):
+        """
+        Sends everything collected since the last flush. With a packet, states which would not change anything
+        are dropped first.
+        """
+        cars, ball, game_info = self.cars, self.ball, self.game_info
+        self.cars, self.ball, self.game_info = {}, None, None
+        if not cars and ball is None and game_info is None:
+            return
+
+        if packet is not None:
+            cars = {index: car_state for index, car_state in cars.items()
+                    if index >= packet.num_cars or not car_matches(packet.game_cars[index], car_state)}
+            if ball is not None and physics_matches(packet.game_ball.physics, ball.physics):
+                ball = None
+            if game_info is not None and game_info.paused is None and game_info.end_match is None and \
+                    components_match(packet.game_info, game_info, ('world_gravity_z', 'game_speed'), 0.001):
+                game_info = None
+            if not cars and ball is None and game_info is None:
+                self.states_suppressed += 1
+                profiler.count('states_suppressed')
+                return
+
+        with profiler.span('set_game_state'), self.lock:
+            self.game_interface.set_game_state(GameState(ball=ball, cars=cars or None, game_info=game_info))
+        self.states_sent += 1
@@ -0,0 +1,123 @@
+import json
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict
+
+# Histogram bucket upper bounds in seconds, from 1 microsecond to about 2 minutes, two buckets per doubling.
+BUCKET_BOUNDS = [1e-6 * 2 ** (i / 2) for i in range(54)]
+
+
+class Histogram:
+    """
+    Latencies bucketed on a log scale, so percentiles are cheap to keep no matter how many ticks an event runs.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.buckets[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """
+        Returns the upper bound of the bucket holding the q-th quantile, or the max if that's smaller.
+        """
+        target = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(BUCKET_BOUNDS, self.buckets):
+            seen += bucket_count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+        }
+
+
+class TickProfiler:
+    """
+    Times named spans of the main loop and counts things, then writes it all out when an event ends.
+    Events can time their own work with `with profiler.span('my_span'):`.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+
+    def record(self, name: str, seconds: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(seconds)
+
+    @contextmanager
+    def span(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def count(self, name: str, amount: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def instrument_renderer(self, renderer):
+        """
+        Times begin_rendering and end_rendering on this renderer instance. end_rendering is where the
+        render message is sent.
+        """
+        if getattr(renderer, 'is_instrumented', False):
+            return
+        begin_rendering, end_rendering = renderer.begin_rendering, renderer.end_rendering
+
+        def timed_begin(*args, **kwargs):
+            with self.span('render_begin'):
+                return begin_rendering(*args, **kwargs)
+
+        def timed_end():
+            with self.span('render_end'):
+                return end_rendering()
+
+        renderer.begin_rendering = timed_begin
+        renderer.end_rendering = timed_end
+        renderer.is_instrumented = True
+
+    def report(self) -> dict:
+        return {
+            "spans": {name: h.summary() for name, h in sorted(self.histograms.items())},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def write_report(self, path: Path):
+        if self.enabled and (self.histograms or self.counters):
+            path.write_text(json.dumps(self.report(), indent=2))
+
+    def reset(self):
+        self.histograms = {}
+        self.counters = {}
+
+
+# Shared by everything in the script, like a logger.
+profiler = TickProfiler()
@@ -4,6 +4,8 @@ from rlbot.utils.structures.game_interface import GameInterface
 
 from data_types.rotator import Rotator
 from data_types.vector3 import Vector3
+from event_utils.state_batcher import GameStateBatcher
+from ui.render_scheduler import render_scheduler, text_2d
 
 
 class TimeLord:
@@ -18,16 +20,21 @@ class TimeLord:
         rotation: Rotator,
         game_interface: GameInterface,
         countdown_seconds=3,
+        state_batcher: GameStateBatcher = None,
     ):
+        """
+        If a state_batcher is given, the car is frozen through it instead of setting game state directly.
+        """
         self.packet_index = packet_index
         self.position = position
         self.rotation = rotation
         self.game_interface = game_interface
+        self.state_setter = state_batcher or game_interface
         self.countdown_start_time: float = None
         self.event_start_time: float = None
         self.is_bot_released = False
         self.done_animating = False
-        self.already_rendered = []
+        self.scheduler = render_scheduler(game_interface.renderer)
         self.render_group = "countdown"
         self.countdown_seconds = countdown_seconds
 
@@ -42,7 +49,7 @@ class TimeLord:
         countdown_elapsed = packet.game_info.seconds_elapsed - self.countdown_start_time
         event_elapsed = countdown_elapsed - self.countdown_seconds
         if countdown_elapsed < self.countdown_seconds:
-            self.render_if_new(str(self.countdown_seconds - int(countdown_elapsed)))
+            self.render_text(str(self.countdown_seconds - int(countdown_elapsed)))
             cars = {self.packet_index: CarState(
                 physics=Physics(
                     location=self.position.to_gamestate(),
@@ -52,29 +59,24 @@ class TimeLord:
                 ),
                 boost_amount=100
             )}
-            self.game_interface.set_game_state(GameState(cars=cars))
-        elif countdown_elapsed < self.countdown_seconds + 1:
+            self.state_setter.set_game_state(GameState(cars=cars))
+        else:
+            # Not just in the second "GO" shows for, a gap between packets could skip right over it.
             self.is_bot_released = True
-            self.render_if_new("GO")
-        elif not self.done_animating:
-            self.game_interface.renderer.clear_screen(self.render_group)
-            self.done_animating = True
+            if countdown_elapsed < self.countdown_seconds + 1:
+                self.render_text("GO")
+            elif not self.done_animating:
+                self.scheduler.clear(self.render_group)
+                self.done_animating = True
 
         if event_elapsed > 0:
-            self.game_interface.renderer.begin_rendering("chronometer")
-            self.game_interface.renderer.draw_string_2d(300, 350, 3, 3, f"{event_elapsed:.3f}", self.game_interface.renderer.lime())
-            self.game_interface.renderer.end_rendering()
+            renderer = self.game_interface.renderer
+            self.scheduler.show("chronometer", text_2d(300, 350, 3, f"{event_elapsed:.3f}", renderer.lime()))
 
     def cleanup(self):
-        self.game_interface.renderer.clear_screen("chronometer")
-        self.game_interface.renderer.clear_screen(self.render_group)
-
-
-    def render_if_new(self, text):
-        if text not in self.already_rendered:
-            self.render_text(text)
+        self.scheduler.clear("chronometer")
+        self.scheduler.clear(self.render_group)
 
     def render_text(self, text):
-        self.game_interface.renderer.begin_rendering(self.render_group)
-        self.game_interface.renderer.draw_string_2d(300, 300, 3, 3, text, self.game_interface.renderer.yellow())
-        self.game_interface.renderer.end_rendering()
+        # Only goes out when the text changes, see RenderScheduler.
+        self.scheduler.show(self.render_group, text_2d(300, 300, 3, text, self.game_interface.renderer.yellow()))
@@ -0,0 +1,178 @@
+"""
+Records what every car did on every tick of an event, so results can be checked and analysed afterwards.
+
+A recording is a directory with one raw little-endian file per column plus columns.json, which says
+what each column holds and which bot each spawn_id belongs to. There is one row per car per tick.
+Columns are only ever appended to, so a recording cut short by a crash is still readable, and
+load_trajectory memory-maps them instead of reading everything in.
+"""
+
+import json
+import queue
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from rlbot.utils.structures.game_data_struct import GameTickPacket
+
+from event_utils.doc_journal import write_atomically
+from event_utils.packet_view import PACKET_CAR_DTYPE
+from event_utils.spawn_helper import ActiveBot
+
+# Name -> (dtype, shape of one row).
+COLUMNS = {
+    'game_time': ('<f4', ()),
+    'frame': ('<i4', ()),
+    'spawn_id': ('<i4', ()),
+    'location': ('<f4', (3,)),
+    'rotation': ('<f4', (3,)),
+    'velocity': ('<f4', (3,)),
+    'angular_velocity': ('<f4', (3,)),
+    'boost': ('u1', ()),
+    'is_demolished': ('?', ()),
+}
+# Rows held in memory before they're handed to the writer thread. About half a minute of 8 cars at 120 Hz.
+BUFFER_ROWS = 32768
+META_FILE = 'columns.json'
+
+
+def new_buffer(rows: int) -> Dict[str, np.ndarray]:
+    return {name: np.empty((rows,) + shape, dtype=dtype) for name, (dtype, shape) in COLUMNS.items()}
+
+
+class TrajectoryRecorder:
+    """
+    Copies each packet into preallocated column buffers, which is cheap enough to do every tick.
+    Full buffers are written out by a background thread so that the disk never holds up a tick.
+    """
+
+    def __init__(self, directory: Path, buffer_rows: int = BUFFER_ROWS):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.buffer_rows = buffer_rows
+        self.buffer = new_buffer(buffer_rows)
+        self.rows_buffered = 0
+        self.last_frame = None
+        self.cars: Dict[int, Dict[str, Optional[str]]] = {}
+        meta_path = self.directory / META_FILE
+        if meta_path.exists():
+            self.cars = {int(k): v for k, v in json.loads(meta_path.read_text())['cars'].items()}
+        self.unlabeled = set()
+        self.chunks = queue.Queue()
+        self.writer = threading.Thread(target=self._write_chunks, daemon=True)
+        self.writer.start()
+
+    def record(self, packet: GameTickPacket):
+        """
+        Adds a row per car, unless this packet's frame was already recorded.
+        """
+        frame = packet.game_info.frame_num
+        num_cars = packet.num_cars
+        if frame == self.last_frame or num_cars == 0:
+            return
+        self.last_frame = frame
+        if self.rows_buffered + num_cars > self.buffer_rows:
+            self.flush()
+
+        cars = np.frombuffer(packet.game_cars, dtype=PACKET_CAR_DTYPE, count=num_cars)
+        rows = slice(self.rows_buffered, self.rows_buffered + num_cars)
+        b = self.buffer
+        b['game_time'][rows] = packet.game_info.seconds_elapsed
+        b['frame'][rows] = frame
+        b['spawn_id'][rows] = cars['spawn_id']
+        physics = cars['physics']
+        b['location'][rows] = physics[:, 0]
+        b['rotation'][rows] = physics[:, 1]
+        b['velocity'][rows] = physics[:, 2]
+        b['angular_velocity'][rows] = physics[:, 3]
+        b['boost'][rows] = cars['boost']
+        b['is_demolished'][rows] = cars['is_demolished']
+        self.rows_buffered += num_cars
+
+        for spawn_id in cars['spawn_id'].tolist():
+            if spawn_id not in self.cars:
+                self.unlabeled.add(spawn_id)
+
+    def label(self, active_bots: List[ActiveBot], packet: GameTickPacket):
+        """
+        Notes which bot each newly seen spawn_id belongs to. Cars the spawn helper doesn't know about
+        (e.g. a human) are labelled with their name from the packet.
+        """
+        by_spawn_id = {ab.spawn_id: ab for ab in active_bots if ab is not None}
+        for index in range(packet.num_cars):
+            car = packet.game_cars[index]
+            if car.spawn_id not in self.unlabeled:
+                continue
+            active_bot = by_spawn_id.get(car.spawn_id)
+            self.cars[car.spawn_id] = {
+                'name': active_bot.name if active_bot else car.name,
+                'config_path': active_bot.bundle.config_path if active_bot else None,
+            }
+        self.unlabeled.clear()
+
+    def flush(self):
+        """
+        Hands whatever is buffered to the writer thread.
+        """
+        if self.rows_buffered:
+            chunk = {name: column[:self.rows_buffered] for name, column in self.buffer.items()}
+            self.chunks.put((chunk, dict(self.cars)))
+            self.buffer = new_buffer(self.buffer_rows)
+            self.rows_buffered = 0
+
+    def close(self):
+        self.flush()
+        # Rewrites the labels once more, in case cars were labelled after the last chunk.
+        self.chunks.put(({}, dict(self.cars)))
+        self.chunks.put(None)
+        self.writer.join()
+
+    def _write_chunks(self):
+        files = {name: open(self.directory / f'{name}.bin', 'ab') for name in COLUMNS}
+        try:
+            while True:
+                item = self.chunks.get()
+                if item is None:
+                    break
+                chunk, cars = item
+                for name, column in chunk.items():
+                    files[name].write(column.tobytes())
+                    files[name].flush()
+                self._write_meta(cars)
+        finally:
+            for f in files.values():
+                f.close()
+
+    def _write_meta(self, cars: Dict[int, Dict[str, Optional[str]]]):
+        meta = {
+            'columns': {name: {'dtype': dtype, 'shape': list(shape)} for name, (dtype, shape) in COLUMNS.items()},
+            'cars': {str(spawn_id): info for spawn_id, info in cars.items()},
+        }
+        # Swapped in whole, so a crash never leaves the recording without readable metadata.
+        write_atomically(self.directory / META_FILE, json.dumps(meta, indent=2))
+
+
+def load_trajectory(directory: Path) -> Dict[str, np.ndarray]:
+    """
+    Memory-maps a recording's columns. Every column gets the same number of rows, even if the
+    recording was cut off partway through writing a chunk.
+    """
+    meta = json.loads((directory / META_FILE).read_text())
+    columns = {}
+    for name, info in meta['columns'].items():
+        dtype, shape = np.dtype(info['dtype']), tuple(info['shape'])
+        path = directory / f'{name}.bin'
+        row_bytes = dtype.itemsize * int(np.prod(shape))
+        rows = path.stat().st_size // row_bytes if path.exists() else 0
+        if rows == 0:
+            columns[name] = np.empty((0,) + shape, dtype=dtype)
+        else:
+            columns[name] = np.memmap(path, dtype=dtype, mode='r', shape=(rows,) + shape)
+    num_rows = min(len(c) for c in columns.values())
+    return {name: column[:num_rows] for name, column in columns.items()}
+
+
+def load_car_labels(directory: Path) -> Dict[int, Dict[str, Optional[str]]]:
+    meta = json.loads((directory / META_FILE).read_text())
+    return {int(spawn_id): info for spawn_id, info in meta['cars'].items()}
@@ -0,0 +1,134 @@
+from collections import defaultdict
+from itertools import product
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from data_types.vector3 import Vector3, Vector3Array
+
+# Below this many waypoints, checking all of them at once is cheaper than looking up grid cells.
+GRID_THRESHOLD = 64
+
+
+def sweep_entry(starts: np.ndarray, ends: np.ndarray, centers: np.ndarray, radius: float) -> np.ndarray:
+    """
+    How far along each segment (0 at its start, 1 at its end) it first comes within radius of a center,
+    or nan if it never does. Arguments are (..., 3) arrays which broadcast against each other, so one call
+    can test many segments against many waypoints.
+    """
+    f = starts - centers
+    d = np.broadcast_to(ends - starts, f.shape)
+    a = np.einsum('...k,...k->...', d, d)
+    b = np.einsum('...k,...k->...', f, d)
+    c = np.einsum('...k,...k->...', f, f) - radius ** 2
+    disc = b * b - a * c
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entry = (-b - np.sqrt(disc)) / a
+    crosses = (a > 0) & (disc > 0) & (entry >= 0) & (entry <= 1)
+    return np.where(c < 0, 0.0, np.where(crosses, entry, np.nan))
+
+
+class WaypointTracker:
+    """
+    Keeps track of which waypoints of a course a car has visited. The course is held as an (n, 3) array
+    with a boolean completion mask. Large courses are bucketed into a uniform grid with cells as wide as the
+    tolerance, so a hit test only has to look at the 27 cells around the car no matter how long the course is.
+
+    Positions can either be checked one at a time, or swept from the previous check to the current one,
+    which catches waypoints the car passed through in between and works out when it got there.
+    """
+
+    def __init__(self, waypoints: Union[Vector3Array, List[Vector3]], tolerance: float):
+        self.positions = Vector3Array(waypoints).array
+        self.tolerance = tolerance
+        self.completed = np.zeros(len(self.positions), dtype=bool)
+        self.completion_times = np.full(len(self.positions), np.nan)
+        self.num_completed = 0
+        self.grid: Dict[Tuple[int, int, int], np.ndarray] = None
+        if len(self.positions) > GRID_THRESHOLD:
+            self.grid = self._build_grid()
+
+    def _cell_of(self, position) -> Tuple[int, int, int]:
+        return tuple(int(c) for c in np.floor(np.asarray(position) / self.tolerance))
+
+    def _build_grid(self) -> Dict[Tuple[int, int, int], np.ndarray]:
+        cells = defaultdict(list)
+        for idx, cell in enumerate(np.floor(self.positions / self.tolerance).astype(np.int64)):
+            cells[tuple(cell)].append(idx)
+        return {cell: np.array(indices, dtype=np.int64) for cell, indices in cells.items()}
+
+    def _candidates(self, position: np.ndarray) -> np.ndarray:
+        if self.grid is None:
+            return np.flatnonzero(~self.completed)
+        cx, cy, cz = self._cell_of(position)
+        found = [self.grid.get((cx + dx, cy + dy, cz + dz)) for dx, dy, dz in product((-1, 0, 1), repeat=3)]
+        found = [f for f in found if f is not None]
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.concatenate(found)
+        return candidates[~self.completed[candidates]]
+
+    def _segment_candidates(self, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+        if self.grid is None:
+            return np.flatnonzero(~self.completed)
+        low = np.minimum(self._cell_of(start), self._cell_of(end)) - 1
+        high = np.maximum(self._cell_of(start), self._cell_of(end)) + 1
+        if np.prod(high - low + 1) > len(self.grid):
+            # The segment spans more cells than the course occupies, so look at the occupied ones instead.
+            cells = [cell for cell in self.grid if (low <= cell).all() and (cell <= high).all()]
+        else:
+            cells = product(*(range(lo, hi + 1) for lo, hi in zip(low.tolist(), high.tolist())))
+        found = [self.grid[cell] for cell in cells if cell in self.grid]
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.concatenate(found)
+        return candidates[~self.completed[candidates]]
+
+    def _complete(self, hits: np.ndarray, times) -> List[int]:
+        self.completed[hits] = True
+        self.completion_times[hits] = times
+        self.num_completed += len(hits)
+        return hits.tolist()
+
+    def check(self, position: Vector3, time: Optional[float] = None) -> List[int]:
+        """
+        Marks every outstanding waypoint within tolerance of the position as completed, at the given time.
+        Returns the indices of the waypoints that were newly completed.
+        """
+        pos = np.array([position.x, position.y, position.z])
+        candidates = self._candidates(pos)
+        if len(candidates) == 0:
+            return []
+        offsets = self.positions[candidates] - pos
+        dist_sq = np.einsum('ij,ij->i', offsets, offsets)
+        hits = candidates[dist_sq < self.tolerance ** 2]
+        return self._complete(hits, np.nan if time is None else time)
+
+    def sweep(self, start: Vector3, end: Vector3, start_time: float, end_time: float) -> List[int]:
+        """
+        Marks every outstanding waypoint that the car came within tolerance of while moving in a straight line
+        from start to end. Completion times are interpolated along the segment, so they're finer than the
+        spacing between checks. Returns the indices of the waypoints that were newly completed.
+        """
+        a = np.array([start.x, start.y, start.z])
+        b = np.array([end.x, end.y, end.z])
+        candidates = self._segment_candidates(a, b)
+        if len(candidates) == 0:
+            return []
+        entry = sweep_entry(a, b, self.positions[candidates], self.tolerance)
+        hit = ~np.isnan(entry)
+        return self._complete(candidates[hit], start_time + entry[hit] * (end_time - start_time))
+
+    def finish_time(self) -> float:
+        """
+        When the last waypoint was completed, or nan if the course isn't complete or times weren't given.
+        """
+        return float(self.completion_times.max()) if self.is_complete() and len(self.positions) else np.nan
+
+    def is_complete(self) -> bool:
+        return self.num_completed >= len(self.positions)
+
+    def reset(self):
+        self.completed[:] = False
+        self.completion_times[:] = np.nan
+        self.num_completed = 0
@@ -22,14 +22,18 @@ All bots spawn at once at the specified `starts`.
 The goal is to demo as many cars as you can, and avoid getting demoed.
 If `perma_death` is true, when your bot is demolished, it won't respawn (it actually does but it gets teleported outside the map).
 The event ends when there is only one bot alive or `max_duration` has passed.
+
+If the script is restarted in the middle of a derby, the derby resumes from its last checkpoint: the cars are
+spawned again where they were, and released after a countdown, from a standstill. The same message is sent again.
 """
 
 import math
 from dataclasses import dataclass
 from pathlib import Path
 import random
-from typing import List, Dict
+from typing import List, Dict, Optional
 
+import numpy as np
 from mashumaro import DataClassJSONMixin
 from rlbot.utils.game_state_util import GameState, CarState, Physics as DesiredPhysics
 from rlbot.utils.structures.game_data_struct import GameTickPacket
@@ -40,8 +44,10 @@ from data_types.physics import Physics
 from data_types.rotator import Rotator
 from data_types.vector3 import Vector3
 from event import Event, EventMeta, EventStatus
-from event_utils.spawn_helper import ActiveBot, CompletedSpawn, SpawnHelper
-from event_utils.time_lord import TimeLord
+from event_utils.doc_journal import DocumentJournal
+from event_utils.spawn_helper import ActiveBot, CompletedSpawn, PooledBot, SpawnHelper
+from event_utils.event_clock import EventClock
+from ui.render_scheduler import render_scheduler
 
 
 @dataclass
@@ -56,11 +62,34 @@ class DerbySpecification(DataClassJSONMixin):
     event_type: str = "DemolitionDerby"
 
 
+@dataclass
+class CarCheckpoint(DataClassJSONMixin):
+    physics: Physics
+    boost: int
+    demolitions: int
+    is_dead: bool
+
+
+@dataclass
+class DerbyCheckpoint(DataClassJSONMixin):
+    """
+    Where a derby that's still running had got to, so it can carry on if the script is restarted.
+    """
+    event_time: float
+    # By competitor config path.
+    cars: Dict[str, CarCheckpoint]
+
+
+# How often a running derby saves a checkpoint, in seconds of event time.
+CHECKPOINT_INTERVAL = 5.0
+
+
 @dataclass
 class EventDocument(DataClassJSONMixin):
     derby_spec: DerbySpecification
     competitor_cfg_files: List[str]
     result_demolitions: Dict[str, int]
+    checkpoint: Optional[DerbyCheckpoint] = None
 
 
 @dataclass
@@ -68,8 +97,18 @@ class ActiveBotInfo:
     competitor: Competitor
     active_bot: ActiveBot
     packet_index: int
-    time_lord: TimeLord
     is_dead: bool = False
+    # Score info counts for the whole match, and bots may be reused from earlier events.
+    demolitions_at_start: int = None
+    # Demolitions scored before the derby was resumed.
+    resumed_demolitions: int = 0
+    # A dead bot's score stops where it was when it died.
+    demolitions_at_death: int = None
+
+    def scored(self, demos: int) -> int:
+        if self.demolitions_at_death is not None:
+            return self.demolitions_at_death
+        return demos - self.demolitions_at_start
 
 
 class DemolitionDerby(Event):
@@ -81,26 +120,25 @@ class DemolitionDerby(Event):
         self.name = "Demolition Derby"
         self.file: Path = None
         self.event_doc: EventDocument = None
-        
+        self.journal: DocumentJournal = None
+
         self.derby_started = False
         self.infos: List[ActiveBotInfo] = None
+        self.clock: EventClock = None
+        self.packet_indices: np.ndarray = None
+        self.pooled: List[PooledBot] = []
+        self.last_checkpoint_time = 0.0
 
     def load_event(self, doc: EventMeta, spawn_helper: SpawnHelper, game_interface: GameInterface) -> None:
         """
         Loads the derby tracking document from disk and initializes game interface type stuff.
         """
         super().load_event(doc, spawn_helper, game_interface)
-        doc_text = Path(doc.event_doc_path).read_text()
-        self.event_doc = EventDocument.from_json(doc_text)
-        self.competitors = [Competitor.from_config_path(p) for p in self.event_doc.competitor_cfg_files]
+        self.journal = DocumentJournal(Path(doc.event_doc_path))
+        self.event_doc = self.journal.load(EventDocument)
 
-    def save_doc(self):
-        """
-        Writes the derby tracking document to disk.
-        """
-        json = self.event_doc.to_json()
-        path = Path(self.event_meta.event_doc_path)
-        path.write_text(json)
+    def activate(self) -> None:
+        self.competitors = Competitor.from_config_paths(self.event_doc.competitor_cfg_files)
 
     def init_event(self, competitors: List[Competitor], competition_dir: Path) -> EventMeta:
         """
@@ -131,46 +169,66 @@ class DemolitionDerby(Event):
         )
 
         self.file = self.competition_dir / 'DemolitionDerby.json'
-        self.file.write_text(event_doc.to_json())
+        DocumentJournal(self.file).create(event_doc)
 
         return EventMeta(event_type='DemolitionDerby', event_doc_path=str(self.file))
 
     def start_derby(self):
         derby_spec = self.event_doc.derby_spec
-        self.spawn_helper.clear_bots()
+        checkpoint = self.event_doc.checkpoint
 
         self.on_screen_log.log(f"About to spawn bots for DemolitionDerby.")
-        completed_spawns = self.spawn_helper.spawn_bots([competitor.bundle for competitor in self.competitors])
+        # Nobody else may stay parked in the arena, the bots would go after them.
+        self.pooled = self.spawn_helper.acquire([competitor.bundle for competitor in self.competitors], exclusive=True)
+        completed_spawns = [pooled.spawn for pooled in self.pooled]
 
         self.on_screen_log.log("Waiting for bots to get ready")
-        # We expect a number of ready messages equal to the number of competitors. Doesn't matter in which order they arrive.
-        # Currently we have no way of knowing which bot sent which message, so we don't know who supports this event.
-        for i in range(len(self.competitors)):
-            self.hide_ball()
-            self.spawn_helper.listen_for_events_supported_by_bot(timeout=7)
-            self.on_screen_log.log(f"{i+1}/{len(self.competitors)} bots ready")
+        self.hide_ball()
+        self.state_batcher.flush()  # Don't wait for the end of the tick, the handshake takes a while.
+        render_scheduler(self.renderer).flush()
+        report = self.spawn_helper.handshake(self.pooled)
+        for pooled in self.pooled:
+            self.is_event_supported(pooled.spawn.bot.name, pooled.supported_events)
+        if report.anonymous:
+            self.on_screen_log.log(f"{len(report.anonymous)} bots were ready but didn't say who they are.")
 
         self.broadcast_to_bots(derby_spec.to_dict())
 
-        self.game_interface.set_game_state(GameState(cars={spawn.packet_index: CarState(
-            physics=start.to_gamestate(),
-            boost_amount=0
-        ) for spawn, start in zip(completed_spawns, derby_spec.starts)}))
-
-        self.hide_ball()
-
         self.infos = [ActiveBotInfo(
             competitor=competitor,
             active_bot=spawn.bot,
             packet_index=spawn.packet_index,
-            time_lord=TimeLord(
-                spawn.packet_index,
-                start.location,
-                start.rotation,
-                self.game_interface,
-                countdown_seconds=10,
-            ),
-        ) for spawn, competitor, start in zip(completed_spawns, self.competitors, derby_spec.starts)]
+        ) for spawn, competitor in zip(completed_spawns, self.competitors)]
+        self.packet_indices = np.array([info.packet_index for info in self.infos])
+
+        starts = {info.packet_index: (start, 0) for info, start in zip(self.infos, derby_spec.starts)}
+        if checkpoint is not None:
+            self.on_screen_log.log(f"Resuming derby from {checkpoint.event_time:.1f} seconds in.")
+            for info in self.infos:
+                car = checkpoint.cars.get(info.competitor.bundle.config_path)
+                if car is not None:
+                    starts[info.packet_index] = (car.physics, car.boost)
+                    info.resumed_demolitions = car.demolitions
+                    info.is_dead = car.is_dead
+                    if car.is_dead:
+                        info.demolitions_at_death = car.demolitions
+
+        self.state_batcher.set_game_state(GameState(cars={packet_index: CarState(
+            physics=start.to_gamestate(),
+            boost_amount=boost
+        ) for packet_index, (start, boost) in starts.items()}))
+
+        self.hide_ball()
+
+        # Everyone starts together, on one clock.
+        resume_at = checkpoint.event_time if checkpoint is not None else 0.0
+        self.clock = EventClock(self.game_interface, countdown_seconds=10, state_batcher=self.state_batcher,
+                                resume_at=resume_at)
+        self.last_checkpoint_time = resume_at
+        for info in self.infos:
+            if not info.is_dead:
+                start = starts[info.packet_index][0]
+                self.clock.freeze(info.packet_index, start.location, start.rotation)
 
         self.on_screen_log.log("Starting derby!")
         self.derby_started = True
@@ -181,32 +239,71 @@ class DemolitionDerby(Event):
         It spawns all the cars and tracks their demolitions.
         """
         if not self.derby_started:
+            if self.event_doc.result_demolitions:
+                # Finished before the script was restarted, but not marked complete in time.
+                return EventStatus(is_complete=True)
             self.start_derby()
             return EventStatus(is_complete=False)  # exit out of this tick so we can get a fresh packet
 
         car_states = {}
-        for info in self.infos:
-            info.time_lord.tick(packet)
-            if not info.is_dead and self.perma_death and packet.game_cars[info.packet_index].is_demolished:
+        self.clock.tick(packet)
+        view = self.packet_view
+        demolitions = view.demolitions[self.packet_indices].tolist()
+        is_demolished = view.is_demolished[self.packet_indices].tolist()
+        for info, demos, demolished in zip(self.infos, demolitions, is_demolished):
+            if info.demolitions_at_start is None:
+                info.demolitions_at_start = demos - info.resumed_demolitions
+            if not info.is_dead and self.perma_death and demolished:
                 info.is_dead = True
+                info.demolitions_at_death = info.scored(demos)
                 self.on_screen_log.log(f"{info.competitor.name()} is permanently dead")
 
             # hide dead bots
             if info.is_dead:
                 car_states[info.packet_index] = CarState(DesiredPhysics(
-                    location=Vector3(info.packet_index * 100, 0, 3000).to_gamestate()))
+                    location=Vector3(info.packet_index * 100, 0, 3000).to_gamestate(),
+                    velocity=Vector3(0, 0, 0).to_gamestate(),
+                    angular_velocity=Vector3(0, 0, 0).to_gamestate()))
 
         # if only one bot is alive or we ran out of time, end the event
         bots_alive = sum(not info.is_dead for info in self.infos)
-        if bots_alive <= 1 or self.infos[0].time_lord.get_event_elapsed_time(packet) > self.max_duration:
-            for info in self.infos:
-                demos_scored = packet.game_cars[info.packet_index].score_info.demolitions
-                self.event_doc.result_demolitions[info.competitor.bundle.config_path] = demos_scored
-                info.time_lord.cleanup()
+        if bots_alive <= 1 or self.clock.get_event_elapsed_time(packet) > self.max_duration:
+            for info, demos in zip(self.infos, demolitions):
+                self.event_doc.result_demolitions[info.competitor.bundle.config_path] = info.scored(demos)
+            self.clock.cleanup()
             self.on_screen_log.clear()
-            self.save_doc()
+            self.event_doc.checkpoint = None
+            self.journal.record({'result_demolitions': self.event_doc.result_demolitions, 'checkpoint': None})
+            self.journal.compact()
+            self.spawn_helper.release(self.pooled)
             return EventStatus(is_complete=True)
 
-        self.game_interface.set_game_state(GameState(cars=car_states))
+        if self.clock.is_released:
+            event_time = self.clock.get_event_elapsed_time(packet)
+            if event_time - self.last_checkpoint_time >= CHECKPOINT_INTERVAL:
+                self.save_checkpoint(event_time, demolitions)
+
+        self.state_batcher.set_game_state(GameState(cars=car_states))
         return EventStatus(is_complete=False)
 
+    def save_checkpoint(self, event_time: float, demolitions: List[int]):
+        """
+        Journals every car's physics, boost and score so far, straight from the packet view.
+        """
+        view = self.packet_view
+        indices = self.packet_indices
+        cars = {}
+        for info, demos, location, rotation, velocity, angular_velocity, boost in zip(
+                self.infos, demolitions, view.location[indices].tolist(), view.rotation[indices].tolist(),
+                view.velocity[indices].tolist(), view.angular_velocity[indices].tolist(),
+                view.boost[indices].tolist()):
+            cars[info.competitor.bundle.config_path] = CarCheckpoint(
+                physics=Physics(location=Vector3(*location), rotation=Rotator(*rotation),
+                                velocity=Vector3(*velocity), angular_velocity=Vector3(*angular_velocity)),
+                boost=boost,
+                demolitions=info.scored(demos),
+                is_dead=info.is_dead)
+        self.event_doc.checkpoint = DerbyCheckpoint(event_time=event_time, cars=cars)
+        self.journal.record({'checkpoint': self.event_doc.checkpoint.to_dict()})
+        self.last_checkpoint_time = event_time
+
@@ -16,15 +16,33 @@ To support this event type, you must listen on matchcomms for an event shaped li
 
 Visit the waypoints as fast as possible, in any order that you wish. You will be scored based on the total time.
 The center of the car (its 'location' in the game tick packet) must get within a distance of waypoint_tolerance
-from a particular waypoint to satisfy it.
+from a particular waypoint to satisfy it. Passing through a waypoint between two packets counts too, and the time
+is taken from the moment the car's path entered the waypoint.
+
+Several bots may race at once in a heat. The message then also has a "lanes" list (see Lane) with one entry
+per car, and each bot should race the "start" and "waypoints" of the lane whose "spawn_id" matches its own car:
+{
+  ...,
+  "lanes": [
+    {"spawn_id": 1234, "start": {...}, "waypoints": [{"x": -514.0, "y": 1266.0, "z": 486.0}]},
+    ...
+  ]
+}
+With the 'shared' lane layout every lane has the top-level waypoints, so bots that ignore lanes still race the
+right course. With the 'mirrored' layout, each lane races a mirror image of the whole course, start included, so
+every lane is exactly as long. That allows at most 4 lanes. Mirror images still cross wherever the course crosses
+x=0 or y=0, so cars can meet there. With the 'separate' layout, each lane races a copy of the course shrunk to fit
+its own strip of the field, with room to spare between strips, so cars that keep to their lane never meet.
+That allows at most 3 lanes.
 """
 
 import math
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from random import randint
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 
+import numpy as np
 from mashumaro import DataClassJSONMixin
 from rlbot.utils.game_state_util import GameState, CarState
 from rlbot.utils.structures.game_data_struct import GameTickPacket
@@ -33,11 +51,26 @@ from rlbot.utils.structures.game_interface import GameInterface
 from competitor import Competitor
 from data_types.physics import Physics
 from data_types.rotator import Rotator
-from data_types.vector3 import Vector3
+from data_types.vector3 import Vector3, Vector3Array
 from event import Event, EventMeta, EventStatus
-from event_utils.spawn_helper import SpawnHelper
+from event_utils.doc_journal import DocumentJournal
+from event_utils.spawn_helper import PooledBot, SpawnHelper
 from event_utils.time_lord import TimeLord
-from ui.wait_for_press import KeyWaiter
+from event_utils.waypoint_tracker import WaypointTracker
+from ui.render_scheduler import render_scheduler
+from ui.sphere_renderer import SphereRenderer
+
+# Sideways distance between the start pads of neighbouring lanes.
+LANE_SPACING = 300
+# How each lane flips the course in the 'mirrored' layout, as (x, y) signs. There's one lane per mirror image.
+MIRRORS = [(1, 1), (-1, 1), (1, -1), (-1, -1)]
+# Width of the field the 'separate' layout splits into strips, one per lane, and the room left between the courses
+# of neighbouring strips so cars can turn without crossing into the next lane.
+SEPARATE_FIELD_WIDTH = 7500
+SEPARATE_LANE_GAP = 1500
+SEPARATE_MAX_LANES = 3
+# Waypoint height on ground courses, low enough to reach without leaving the floor.
+GROUND_WAYPOINT_Z = 50
 
 
 @dataclass
@@ -46,51 +79,168 @@ class RaceSpecification(DataClassJSONMixin):
     This will be saved in the file, and also sent to bots via matchcomms to tell them
     they'll be racing and where to go.
     """
-    waypoints: List[Vector3]
+    waypoints: Vector3Array
     waypoint_tolerance: float
     start: Physics
     event_type: str = "WaypointRace"
 
 
+@dataclass
+class Lane(DataClassJSONMixin):
+    """
+    Where one car of a heat starts and which waypoints it must visit.
+    """
+    spawn_id: int
+    start: Physics
+    waypoints: Vector3Array
+
+
+@dataclass
+class RunRecord(DataClassJSONMixin):
+    """
+    When a competitor's race started (in game seconds) and which lane they raced in,
+    so the run can be re-scored from a trajectory recording later.
+    """
+    start_time: float
+    lane_index: int
+
+
 @dataclass
 class EventDocument(DataClassJSONMixin):
     race_spec: RaceSpecification
     competitor_cfg_files: List[str]
     result_times: Dict[str, float]
+    heat_size: int = 1
+    lane_layout: str = 'shared'
+    runs: Dict[str, RunRecord] = field(default_factory=dict)
+    check_rate: Optional[float] = None
+
+
+@dataclass
+class LaneRunner:
+    competitor: Competitor
+    lane: Lane
+    lane_index: int
+    packet_index: int
+    time_lord: TimeLord
+    waypoint_tracker: WaypointTracker
+    is_finished: bool = False
+    # Where the car was and the game time at the last waypoint check, so the next check can sweep from there.
+    last_check: Optional[Tuple[Vector3, float]] = None
 
 
-def get_random_waypoint() -> Vector3:
-    return Vector3(x=randint(-2000, 2000), y=randint(-2000, 2000), z=randint(50, 500))
+def get_random_waypoint(ground_course=False) -> Vector3:
+    x, y = randint(-2000, 2000), randint(-2000, 2000)
+    return Vector3(x=x, y=y, z=GROUND_WAYPOINT_Z if ground_course else randint(50, 500))
+
+
+def mirror_physics(physics: Physics, sx: int, sy: int, shift_x: float = 0) -> Physics:
+    """
+    Moves physics by shift_x along x, then mirrors it across the x and/or y axis, as given by the signs.
+    """
+    location, rotation = physics.location, physics.rotation
+    yaw = rotation.yaw if sx > 0 else math.pi - rotation.yaw
+    # A reflection turns the car's handedness around, so roll and the angular velocity flip too.
+    handedness = sx * sy
+    angular = physics.angular_velocity
+    return Physics(
+        location=Vector3((location.x + shift_x) * sx, location.y * sy, location.z),
+        rotation=Rotator(rotation.pitch, yaw * sy, rotation.roll * handedness),
+        velocity=Vector3(physics.velocity.x * sx, physics.velocity.y * sy, physics.velocity.z),
+        angular_velocity=Vector3(angular.x * sx * handedness, angular.y * sy * handedness, angular.z * handedness))
+
+
+def lane_course(race_spec: RaceSpecification, lane_index: int, heat_size: int,
+                lane_layout: str) -> Tuple[Physics, Vector3Array]:
+    """
+    Works out the start pad and waypoints for one lane of a heat.
+
+    With the 'shared' layout, start pads sit side by side, centered on the race's start, and every lane has the
+    race's waypoints. With the 'mirrored' layout, the whole course is moved half a lane sideways, so that the
+    start pads of lanes mirrored across x don't overlap, and then mirrored for each lane. Every lane is then an
+    exact copy of the same course. With the 'separate' layout, the course is shrunk, if need be, to fit a strip
+    of the field as wide as heat_size allows, and moved into the lane's strip. The shrinking depends on heat_size
+    only, so it should be the event's heat size, not how many cars a short last heat has.
+    """
+    start = race_spec.start
+    if lane_layout == 'separate':
+        waypoints = race_spec.waypoints.array.copy()
+        points = np.vstack([waypoints[:, :2], [(start.location.x, start.location.y)]])
+        low, high = points.min(axis=0), points.max(axis=0)
+        center = (low + high) / 2
+        strip_width = SEPARATE_FIELD_WIDTH / heat_size
+        scale = min(1.0, (strip_width - SEPARATE_LANE_GAP) / max(high[0] - low[0], 1))
+        lane_center = np.array([-SEPARATE_FIELD_WIDTH / 2 + strip_width * (lane_index + 0.5), center[1]])
+        waypoints[:, :2] = (waypoints[:, :2] - center) * scale + lane_center
+        x, y = ((np.array([start.location.x, start.location.y]) - center) * scale + lane_center).tolist()
+        lane_start = Physics(
+            location=Vector3(x, y, start.location.z),
+            rotation=start.rotation,
+            velocity=start.velocity,
+            angular_velocity=start.angular_velocity)
+        return lane_start, Vector3Array(waypoints)
+    if lane_layout == 'mirrored':
+        sx, sy = MIRRORS[lane_index]
+        shift_x = LANE_SPACING / 2
+        waypoints = (race_spec.waypoints.array + (shift_x, 0, 0)) * (sx, sy, 1)
+        return mirror_physics(start, sx, sy, shift_x), Vector3Array(waypoints)
+    offset = (lane_index - (heat_size - 1) / 2) * LANE_SPACING
+    lane_start = Physics(
+        location=Vector3(start.location.x + offset, start.location.y, start.location.z),
+        rotation=start.rotation,
+        velocity=start.velocity,
+        angular_velocity=start.angular_velocity)
+    return lane_start, race_spec.waypoints
 
 
 class WaypointRace(Event):
-    def __init__(self) -> None:
+    def __init__(self, heat_size=1, lane_layout='shared', check_rate: float = None, ground_course=False) -> None:
+        """
+        :param heat_size: How many competitors race at the same time.
+        :param lane_layout: 'shared' puts everyone on the same course, so cars can run into each other.
+        'mirrored' gives lanes mirrored copies of the course, which still cross each other.
+        'separate' gives lanes shrunk copies of the course side by side, so cars stay apart.
+        :param check_rate: How many times per second to check for waypoints, or None for every packet.
+        The car's path between checks is swept, so a lower rate doesn't miss waypoints or round off times.
+        :param ground_course: Puts every waypoint within reach of a car on the floor, e.g. for simulated arenas
+        without jumping (see headless/kinematic_sim.py).
+        """
         super().__init__()
+        if lane_layout not in ('shared', 'mirrored', 'separate'):
+            raise ValueError(f"Unknown lane layout {lane_layout}, expected 'shared', 'mirrored' or 'separate'.")
+        if lane_layout == 'mirrored' and heat_size > len(MIRRORS):
+            raise ValueError(f"The mirrored lane layout has room for {len(MIRRORS)} lanes, not {heat_size}.")
+        if lane_layout == 'separate' and heat_size > SEPARATE_MAX_LANES:
+            raise ValueError(f"The separate lane layout has room for {SEPARATE_MAX_LANES} lanes, not {heat_size}.")
+        self.heat_size = heat_size
+        self.lane_layout = lane_layout
+        self.check_rate = check_rate
+        self.ground_course = ground_course
         self.name = "Waypoint Race"
         self.file: Path = None
         self.event_doc: EventDocument = None
-        self.active_competitor: Competitor = None
-        self.competitor_has_begun = False
-        self.competitor_packet_index: int = None
-        self.completed_waypoints_indices: List[int] = []
-        self.time_lord: TimeLord = None
+        self.journal: DocumentJournal = None
+        self.heat_competitors: List[Competitor] = None
+        self.heat_is_confirmed = False
+        self.heat_has_begun = False
+        self.runners: List[LaneRunner] = []
+        self.pooled: List[PooledBot] = []
+        self.sphere_renderer: SphereRenderer = None
 
     def load_event(self, doc: EventMeta, spawn_helper: SpawnHelper, game_interface: GameInterface) -> None:
         """
         Loads the race tracking document from disk and initializes game interface type stuff.
         """
         super().load_event(doc, spawn_helper, game_interface)
-        doc_text = Path(doc.event_doc_path).read_text()
-        self.event_doc = EventDocument.from_json(doc_text)
-        self.competitors = [Competitor.from_config_path(p) for p in self.event_doc.competitor_cfg_files]
+        self.journal = DocumentJournal(Path(doc.event_doc_path))
+        self.event_doc = self.journal.load(EventDocument)
+        self.heat_size = self.event_doc.heat_size
+        self.lane_layout = self.event_doc.lane_layout
+        self.check_rate = self.event_doc.check_rate
+        self.sphere_renderer = SphereRenderer(self.renderer, 'waypoints')
 
-    def save_doc(self):
-        """
-        Writes the race tracking document to disk.
-        """
-        json = self.event_doc.to_json()
-        path = Path(self.event_meta.event_doc_path)
-        path.write_text(json)
+    def activate(self) -> None:
+        self.competitors = Competitor.from_config_paths(self.event_doc.competitor_cfg_files)
 
     def init_event(self, competitors: List[Competitor], competition_dir: Path) -> EventMeta:
         """
@@ -102,7 +252,7 @@ class WaypointRace(Event):
         """
         super().init_event(competitors, competition_dir)
 
-        waypoints = [get_random_waypoint() for _ in range(4)]
+        waypoints = Vector3Array(get_random_waypoint(self.ground_course) for _ in range(4))
         start_point = Physics(
             location=Vector3(0, -4000, 50),
             rotation=Rotator(0, math.pi / 2, 0),
@@ -113,101 +263,174 @@ class WaypointRace(Event):
         event_doc = EventDocument(
             race_spec=race_spec,
             competitor_cfg_files=[c.bundle.config_path for c in competitors],
-            result_times={}
+            result_times={},
+            heat_size=self.heat_size,
+            lane_layout=self.lane_layout,
+            check_rate=self.check_rate
         )
 
         self.file = self.competition_dir / 'WaypointRace.json'
-        self.file.write_text(event_doc.to_json())
+        DocumentJournal(self.file).create(event_doc)
 
         return EventMeta(event_type='WaypointRace', event_doc_path=str(self.file))
 
     def check_for_human_usurper(self, packet: GameTickPacket):
         """
-        If there's a human in the game, let them play the event instead of the bot.
+        If there's a human in the game, let them play the event instead of the bot in the first lane.
         This helps with testing.
         """
-        for i in range(packet.num_cars):
-            car = packet.game_cars[i]
-            if len(car.name) and not car.is_bot:
-                self.competitor_packet_index = i
+        if not self.runners:
+            return
+        for i in np.flatnonzero(~self.packet_view.is_bot).tolist():
+            if len(packet.game_cars[i].name):
+                self.runners[0].packet_index = i
 
     def tick_event(self, packet: GameTickPacket) -> EventStatus:
         """
         This is the main logic for running the race.
-        It loops through each competitor, spawning them and tracking their race.
+        It loops through the competitors a heat at a time, spawning them and tracking their race.
         """
-        race_spec = self.event_doc.race_spec
-
         self.check_for_human_usurper(packet)
 
-        if self.active_competitor is not None:
-            if not self.competitor_has_begun and packet.game_info.is_round_active:
-                self.start_new_competitor()
-                self.competitor_has_begun = True
-                self.time_lord = TimeLord(self.competitor_packet_index, race_spec.start.location,
-                                          race_spec.start.rotation, self.game_interface)
-            else:
-                self.time_lord.tick(packet)
-                race_time = self.time_lord.get_event_elapsed_time(packet)
-                self.renderer.begin_rendering('waypoints')
-                competitor_pos = Vector3.from_vec(packet.game_cars[self.competitor_packet_index].physics.location)
-                for idx, w in enumerate(race_spec.waypoints):
-                    if idx not in self.completed_waypoints_indices:
-                        if w.dist(competitor_pos) < race_spec.waypoint_tolerance:
-                            self.completed_waypoints_indices.append(idx)
-                            self.on_screen_log.log(
-                                f"Got waypoint {len(self.completed_waypoints_indices)} / {len(race_spec.waypoints)}! Time so far: {race_time:.3f}")
-                    color = self.renderer.lime() if idx in self.completed_waypoints_indices else self.renderer.yellow()
-                    self.render_sphere(w, race_spec.waypoint_tolerance / 2, color)
-                self.render_sphere(competitor_pos, race_spec.waypoint_tolerance / 2, self.renderer.cyan())
-                self.renderer.end_rendering()
-                waypoints_complete = len(self.completed_waypoints_indices) >= len(race_spec.waypoints)
-                if waypoints_complete:
-                    self.event_doc.result_times[self.active_competitor.bundle.config_path] = race_time
-                    self.on_screen_log.log(
-                        f"{self.active_competitor.name()} has finished with a time of {race_time:.3f}")
-                    self.save_doc()
-                    self.active_competitor = None
+        if self.heat_competitors is not None:
+            if not self.heat_is_confirmed:
+                names = ', '.join(c.name() for c in self.heat_competitors)
+                self.heat_is_confirmed = self.wait_for_press('k', f'start race with {names}')
+            elif not self.heat_has_begun and packet.game_info.is_round_active:
+                self.start_new_heat()
+                self.heat_has_begun = True
+            elif self.heat_has_begun:
+                self.tick_heat(packet)
+                if all(runner.is_finished for runner in self.runners):
+                    self.heat_competitors = None
         else:
-            for competitor in self.competitors:
-                if competitor.bundle.config_path not in self.event_doc.result_times:
-                    self.active_competitor = competitor
-                    self.competitor_has_begun = False
-                    if self.time_lord is not None:
-                        self.time_lord.cleanup()
-                    KeyWaiter().wait_for_press('k', f'start race with {self.active_competitor.name()}',
-                                               self.renderer)
-                    break
+            lacking_times = [c for c in self.competitors if c.bundle.config_path not in self.event_doc.result_times]
+            if lacking_times:
+                self.heat_competitors = lacking_times[:self.heat_size]
+                self.heat_is_confirmed = False
+                self.heat_has_begun = False
+                self.cleanup_runners()
 
         competitors_lacking_times = [c for c in self.competitors if
                                      c.bundle.config_path not in self.event_doc.result_times]
         is_complete = len(competitors_lacking_times) == 0
         if is_complete:
-            self.renderer.clear_screen('waypoints')
+            self.journal.compact()
+            self.sphere_renderer.clear()
             self.on_screen_log.clear()
-            if self.time_lord is not None:
-                self.time_lord.cleanup()
+            self.cleanup_runners()
+            self.spawn_helper.release(self.pooled)
+            self.pooled = []
         return EventStatus(is_complete=is_complete)
 
-    def start_new_competitor(self):
+    def tick_heat(self, packet: GameTickPacket):
+        race_spec = self.event_doc.race_spec
+        radius = race_spec.waypoint_tolerance / 2
+        car_positions = self.packet_view.location[[runner.packet_index for runner in self.runners]]
+        for runner, position in zip(self.runners, car_positions.tolist()):
+            runner.time_lord.tick(packet)
+            competitor_pos = Vector3(*position)
+            if runner.is_finished:
+                continue
+
+            race_time = runner.time_lord.get_event_elapsed_time(packet)
+            tracker = runner.waypoint_tracker
+            newly_completed = self.check_waypoints(runner, packet, competitor_pos)
+            for n in range(tracker.num_completed - len(newly_completed) + 1, tracker.num_completed + 1):
+                self.on_screen_log.log(
+                    f"{self.heat_prefix(runner)}Got waypoint {n} / {len(race_spec.waypoints)}! "
+                    f"Time so far: {race_time:.3f}")
+            if tracker.is_complete():
+                runner.is_finished = True
+                finish_time = tracker.finish_time()
+                if not math.isnan(finish_time):
+                    race_time = finish_time - runner.time_lord.event_start_time
+                config_path = runner.competitor.bundle.config_path
+                run = RunRecord(start_time=runner.time_lord.event_start_time, lane_index=runner.lane_index)
+                self.event_doc.result_times[config_path] = race_time
+                self.event_doc.runs[config_path] = run
+                self.on_screen_log.log(
+                    f"{runner.competitor.name()} has finished with a time of {race_time:.3f}")
+                self.journal.record({'result_times': {config_path: race_time}, 'runs': {config_path: run.to_dict()}})
+
+        # Lanes on the same course share their spheres, which stay yellow until every lane has visited them.
+        courses = {}
+        for runner in self.runners:
+            course = id(runner.lane.waypoints)
+            visited = courses.get(course, (runner.waypoint_tracker.positions, True))[1]
+            courses[course] = (runner.waypoint_tracker.positions, visited & runner.waypoint_tracker.completed)
+        for positions, visited in courses.values():
+            self.sphere_renderer.add(positions[visited], radius, self.renderer.lime())
+            self.sphere_renderer.add(positions[~visited], radius, self.renderer.yellow())
+        self.sphere_renderer.add(car_positions, radius, self.renderer.cyan())
+        self.sphere_renderer.flush(car_positions[0])
+
+    def check_waypoints(self, runner: LaneRunner, packet: GameTickPacket, position: Vector3) -> List[int]:
+        """
+        Sweeps the car's path since the last check against the outstanding waypoints, at most check_rate times
+        per second. Nothing counts before the car is released, and a demolished car starts over from its respawn,
+        so teleports never sweep across the course.
+        """
+        now = packet.game_info.seconds_elapsed
+        if not runner.time_lord.is_bot_released or self.packet_view.is_demolished[runner.packet_index]:
+            runner.last_check = None
+            return []
+        if runner.last_check is None:
+            runner.last_check = (position, now)
+            return runner.waypoint_tracker.check(position, now)
+        last_position, last_time = runner.last_check
+        if self.check_rate and now - last_time < 1 / self.check_rate:
+            return []
+        runner.last_check = (position, now)
+        return runner.waypoint_tracker.sweep(last_position, position, last_time, now)
+
+    def heat_prefix(self, runner: LaneRunner) -> str:
+        return '' if len(self.runners) == 1 else f"{runner.competitor.name()}: "
+
+    def cleanup_runners(self):
+        for runner in self.runners:
+            runner.time_lord.cleanup()
+
+    def start_new_heat(self):
         """
-        Based on self.active_competitor, spawns them into the game and positions them at the beginning of the race.
+        Based on self.heat_competitors, spawns them into the game and positions each at the beginning of their lane.
         """
         race_spec = self.event_doc.race_spec
-        self.spawn_helper.clear_bots()
-        bot_name = self.active_competitor.name()
-
-        self.on_screen_log.log(f"About to spawn {bot_name} for WaypointRace.")
-        completed_spawn = self.spawn_helper.spawn_bots([self.active_competitor.bundle])[0]
-        supported_events = self.spawn_helper.listen_for_events_supported_by_bot(timeout=7)
-        self.is_event_supported(bot_name, supported_events)
-        self.broadcast_to_bots(race_spec.to_dict())
-
-        self.competitor_packet_index = completed_spawn.packet_index
-        cars = {self.competitor_packet_index: CarState(
-            physics=race_spec.start.to_gamestate(),
+        self.spawn_helper.release(self.pooled)
+        bot_names = ', '.join(c.name() for c in self.heat_competitors)
+
+        self.on_screen_log.log(f"About to spawn {bot_names} for WaypointRace.")
+        render_scheduler(self.renderer).flush()  # Spawning and the handshake take a while.
+        self.pooled = self.spawn_helper.acquire([c.bundle for c in self.heat_competitors])
+        completed_spawns = [pooled.spawn for pooled in self.pooled]
+        self.spawn_helper.handshake(self.pooled)
+        for pooled in self.pooled:
+            self.is_event_supported(pooled.spawn.bot.name, pooled.supported_events)
+
+        lanes = []
+        for i, spawn in enumerate(completed_spawns):
+            start, waypoints = lane_course(race_spec, i, self.heat_size, self.lane_layout)
+            lanes.append(Lane(spawn_id=spawn.bot.spawn_id, start=start, waypoints=waypoints))
+        self.broadcast_to_bots({**race_spec.to_dict(), "lanes": [lane.to_dict() for lane in lanes]})
+
+        cars = {spawn.packet_index: CarState(
+            physics=lane.start.to_gamestate(),
             boost_amount=100
-        )}
-        self.game_interface.set_game_state(GameState(cars=cars))
+        ) for spawn, lane in zip(completed_spawns, lanes)}
+        self.state_batcher.set_game_state(GameState(cars=cars))
         self.hide_ball()
-        self.completed_waypoints_indices = []
+
+        self.runners = [LaneRunner(
+            competitor=competitor,
+            lane=lane,
+            lane_index=i,
+            packet_index=spawn.packet_index,
+            time_lord=TimeLord(spawn.packet_index, lane.start.location, lane.start.rotation, self.game_interface,
+                               state_batcher=self.state_batcher),
+            waypoint_tracker=WaypointTracker(lane.waypoints, race_spec.waypoint_tolerance),
+        ) for i, (competitor, spawn, lane) in enumerate(zip(self.heat_competitors, completed_spawns, lanes))]
+
+        # Warm up the next heat while this one races.
+        upcoming = [c for c in self.competitors if c.bundle.config_path not in self.event_doc.result_times
+                    and c not in self.heat_competitors]
+        self.spawn_helper.prespawn([c.bundle for c in upcoming[:self.heat_size]])
@@ -0,0 +1,275 @@
+"""
+A local, in-process stand-in for the parts of RLBot that events talk to, so that events can run
+without a Rocket League match. The arena owns a GameTickPacket and a roster of spawned cars;
+everything that moves the cars comes from a packet script, e.g. a recorded packet stream.
+
+Time in the arena only advances when a packet is requested, so runs go as fast as the events
+themselves can tick.
+"""
+
+import ctypes
+import queue
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+from rlbot.matchconfig.match_config import MatchConfig
+from rlbot.parsing.bot_config_bundle import BotConfigBundle
+from rlbot.utils.game_state_util import GameState
+from rlbot.utils.rendering.rendering_manager import RenderingManager
+from rlbot.utils.structures.game_data_struct import GameTickPacket, MAX_PLAYERS
+
+from event_utils.spawn_helper import ActiveBot, CompletedSpawn, PooledBot, ReadinessReport, SpawnHelper
+
+PacketScript = Callable[[GameTickPacket, 'HeadlessArena'], None]
+
+
+class PacketStreamExhausted(Exception):
+    """
+    Raised when an arena driven by a recorded packet stream runs out of packets.
+    """
+
+
+class HeadlessRenderer(RenderingManager):
+    """
+    A RenderingManager whose native calls go nowhere. It keeps count of what would have been sent,
+    which is useful when measuring how much an event draws.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.next_builder = 1
+        self.messages_sent = 0
+        self.draw_calls = 0
+        self.native_constructor = self._construct
+        self.native_destructor = self._destruct
+        self.native_finish_and_send = self._finish_and_send
+        self.native_draw_line_3d = self._draw
+        self.native_draw_polyline_3d = self._draw
+        self.native_draw_string_2d = self._draw
+        self.native_draw_string_3d = self._draw
+        self.native_draw_rect_2d = self._draw
+        self.native_draw_rect_3d = self._draw
+
+    def _construct(self, group_id_hashed: int) -> int:
+        self.next_builder += 1
+        return self.next_builder
+
+    def _destruct(self, builder: int):
+        pass
+
+    def _finish_and_send(self, builder: int):
+        self.messages_sent += 1
+
+    def _draw(self, builder: int, *args):
+        self.draw_calls += 1
+
+
+class HeadlessMatchcomms:
+    """
+    Has the same queues as rlbot's MatchcommsClient, minus the websocket.
+    """
+
+    def __init__(self):
+        self.incoming_broadcast = queue.Queue()
+        self.outgoing_broadcast = queue.Queue()
+
+
+class HeadlessArena:
+    """
+    Holds the packet that the headless game interface hands out, applies desired game states to it,
+    and advances game time by one frame per fresh packet.
+    """
+
+    def __init__(self, packet_script: PacketScript = None, tick_rate: int = 120,
+                 supported_events: Optional[List[str]] = None):
+        """
+        :param packet_script: Called once per frame to move things around in the packet.
+        :param tick_rate: Frames per second of game time.
+        :param supported_events: What spawned bots will claim to support over matchcomms.
+        None means the bots never send a ready message.
+        """
+        self.packet = GameTickPacket()
+        self.packet.game_info.is_round_active = True
+        self.packet.game_info.game_speed = 1
+        self.packet_script = packet_script
+        self.tick_rate = tick_rate
+        self.supported_events = supported_events
+        self.roster: List[ActiveBot] = []
+        # Told about every new roster, e.g. so that a simulation can start and stop bots along with their cars.
+        self.roster_listeners: List[Callable[[List[ActiveBot]], None]] = []
+        self.matchcomms = HeadlessMatchcomms()
+        self.set_game_state_calls = 0
+
+    def seconds_elapsed(self) -> float:
+        return self.packet.game_info.seconds_elapsed
+
+    def step(self):
+        """
+        Advances game time by one frame and lets the packet script move the cars.
+        """
+        self.packet.game_info.seconds_elapsed += 1 / self.tick_rate
+        self.packet.game_info.frame_num += 1
+        if self.packet_script is not None:
+            self.packet_script(self.packet, self)
+            self.write_roster()
+
+    def set_roster(self, active_bots: List[ActiveBot]):
+        if len(active_bots) > MAX_PLAYERS:
+            raise ValueError(f"The arena only has room for {MAX_PLAYERS} cars, got {len(active_bots)}.")
+        self.roster = list(active_bots)
+        self.write_roster()
+        for listener in self.roster_listeners:
+            listener(self.roster)
+
+    def write_roster(self):
+        """
+        The arena decides who is in the match, whatever the packet script says.
+        """
+        self.packet.num_cars = len(self.roster)
+        for index, active_bot in enumerate(self.roster):
+            car = self.packet.game_cars[index]
+            car.name = active_bot.name
+            car.team = active_bot.team
+            car.spawn_id = active_bot.spawn_id
+            car.is_bot = True
+
+    def apply_game_state(self, game_state: GameState):
+        self.set_game_state_calls += 1
+        if game_state.cars is not None:
+            for index, car_state in game_state.cars.items():
+                if index is None or index >= self.packet.num_cars:
+                    continue
+                car = self.packet.game_cars[index]
+                apply_physics(car.physics, car_state.physics)
+                if car_state.boost_amount is not None:
+                    car.boost = int(car_state.boost_amount)
+                if car_state.jumped is not None:
+                    car.jumped = car_state.jumped
+                if car_state.double_jumped is not None:
+                    car.double_jumped = car_state.double_jumped
+        if game_state.ball is not None:
+            apply_physics(self.packet.game_ball.physics, game_state.ball.physics)
+        if game_state.game_info is not None:
+            if game_state.game_info.world_gravity_z is not None:
+                self.packet.game_info.world_gravity_z = game_state.game_info.world_gravity_z
+            if game_state.game_info.game_speed is not None:
+                self.packet.game_info.game_speed = game_state.game_info.game_speed
+
+
+def apply_physics(physics, desired_physics):
+    """
+    Copies the parts of a game_state_util Physics which are set onto a packet Physics struct.
+    """
+    if desired_physics is None:
+        return
+    apply_vector(physics.location, desired_physics.location, ('x', 'y', 'z'))
+    apply_vector(physics.rotation, desired_physics.rotation, ('pitch', 'yaw', 'roll'))
+    apply_vector(physics.velocity, desired_physics.velocity, ('x', 'y', 'z'))
+    apply_vector(physics.angular_velocity, desired_physics.angular_velocity, ('x', 'y', 'z'))
+
+
+def apply_vector(struct, desired, fields):
+    if desired is None:
+        return
+    for field in fields:
+        value = getattr(desired, field)
+        if value is not None:
+            setattr(struct, field, value)
+
+
+def replay_packets(packets: Iterable[GameTickPacket]) -> PacketScript:
+    """
+    Makes a packet script out of recorded packets. Each frame copies the next recorded packet into the
+    arena, after which the arena's roster is written back on top.
+    """
+    iterator = iter(packets)
+
+    def script(packet: GameTickPacket, arena: HeadlessArena):
+        try:
+            recorded = next(iterator)
+        except StopIteration:
+            raise PacketStreamExhausted()
+        seconds_elapsed = packet.game_info.seconds_elapsed
+        frame_num = packet.game_info.frame_num
+        ctypes.memmove(ctypes.addressof(packet), ctypes.addressof(recorded), ctypes.sizeof(GameTickPacket))
+        packet.game_info.seconds_elapsed = seconds_elapsed
+        packet.game_info.frame_num = frame_num
+
+    return script
+
+
+class HeadlessGameInterface:
+    """
+    The subset of GameInterface that events and TrackAndField use, backed by a HeadlessArena.
+    """
+
+    def __init__(self, arena: HeadlessArena):
+        self.arena = arena
+        self.renderer = HeadlessRenderer()
+
+    def update_live_data_packet(self, game_tick_packet: GameTickPacket) -> GameTickPacket:
+        ctypes.memmove(ctypes.addressof(game_tick_packet), ctypes.addressof(self.arena.packet),
+                       ctypes.sizeof(GameTickPacket))
+        return game_tick_packet
+
+    def fresh_live_data_packet(self, game_tick_packet: GameTickPacket, timeout_millis: int, key: int):
+        self.arena.step()
+        return self.update_live_data_packet(game_tick_packet)
+
+    def set_game_state(self, game_state: GameState) -> None:
+        self.arena.apply_game_state(game_state)
+
+
+class HeadlessSpawnHelper(SpawnHelper):
+    """
+    Spawns bots into a HeadlessArena instead of launching bot processes.
+    """
+
+    def __init__(self, arena: HeadlessArena):
+        # Deliberately skips SpawnHelper.__init__, which would start a SetupManager and matchcomms server.
+        self.arena = arena
+        self.active_bots: List[ActiveBot] = []
+        self.spawn_indices: Dict[int, int] = {}
+        self.parked: List[PooledBot] = []
+        self.in_use: List[PooledBot] = []
+        self.lock = threading.RLock()
+        self.match_lock = threading.Lock()
+        self.prespawn_thread: Optional[threading.Thread] = None
+        self.matchcomms = arena.matchcomms
+
+    def spawn_bots(self, bundles: List[BotConfigBundle], park=False) -> List[CompletedSpawn]:
+        new_active_bots = self._make_active_bots(bundles, 0)
+        self.active_bots += new_active_bots
+        self.arena.set_roster(self.active_bots)
+        self.refresh_spawn_indices(self.arena.packet)
+        if self.arena.supported_events is not None:
+            for active_bot in new_active_bots:
+                self.matchcomms.incoming_broadcast.put_nowait({"readyForTrackAndField": True,
+                                                               "supportedEvents": self.arena.supported_events,
+                                                               "spawn_id": active_bot.spawn_id})
+        spawns = [CompletedSpawn(bot=active_bot, packet_index=self.spawn_indices.get(active_bot.spawn_id))
+                  for active_bot in new_active_bots]
+        if park:
+            self.parked += [PooledBot(spawn) for spawn in spawns]
+        return spawns
+
+    def listen_for_events_supported_by_bot(self, timeout: int = 7) -> List[str]:
+        # Bots in the arena answer immediately or never, so there is nothing worth waiting for.
+        return super().listen_for_events_supported_by_bot(timeout=0)
+
+    def collect_ready_messages(self, bots: List[ActiveBot], timeout: float = 0) -> ReadinessReport:
+        return super().collect_ready_messages(bots, timeout=0)
+
+    def prespawn(self, bundles: List[BotConfigBundle]):
+        super().prespawn(bundles)
+        # The arena isn't safe to touch from another thread, and spawning here is instant anyway.
+        self.finish_prespawn()
+
+    def clear_bots(self):
+        self.active_bots = []
+        self.reset_pool()
+        self.arena.set_roster(self.active_bots)
+        self.refresh_spawn_indices(self.arena.packet)
+
+    def launch_match(self, match_config: MatchConfig, on_spawned: Callable[[], None] = None):
+        pass
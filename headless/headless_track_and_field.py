@@ -0,0 +1,42 @@
+"""
+Runs TrackAndField against a HeadlessArena instead of a live match, faster than real time.
+
+Example:
+    arena = HeadlessArena(packet_script=replay_packets(recorded_packets), supported_events=['WaypointRace'])
+    HeadlessTrackAndField(CompetitionDocument.from_json(path.read_text()), arena).run()
+"""
+
+from pathlib import Path
+
+from rlbot.utils.logging_utils import get_logger
+from rlbot.utils.structures.game_data_struct import GameTickPacket
+
+from headless.headless_arena import HeadlessArena, HeadlessGameInterface, HeadlessSpawnHelper
+from track_and_field import CompetitionDocument, TrackAndField
+from ui.wait_for_press import key_input
+
+
+class HeadlessTrackAndField(TrackAndField):
+    """
+    Prompts are answered immediately (key_input goes unattended), and nothing ever sleeps.
+    """
+
+    def __init__(self, doc: CompetitionDocument, arena: HeadlessArena, record_trajectories=False,
+                 competition_file: Path = None):
+        # Deliberately skips BaseScript.__init__, which would try to connect to a running game.
+        self.logger = get_logger("Headless Track and Field")
+        self.arena = arena
+        self.game_tick_packet = GameTickPacket()
+        self.game_interface = HeadlessGameInterface(arena)
+        self.renderer = self.game_interface.renderer
+        key_input.unattended = True
+        self.start_competition(doc, HeadlessSpawnHelper(arena), record_trajectories, competition_file)
+
+    def get_game_tick_packet(self):
+        return self.game_interface.update_live_data_packet(self.game_tick_packet)
+
+    def wait_game_tick_packet(self):
+        return self.game_interface.fresh_live_data_packet(self.game_tick_packet, 30, 0)
+
+    def wait_for_game_stabilization(self):
+        self.spawn_helper.clear_bots()
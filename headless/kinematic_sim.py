@@ -0,0 +1,405 @@
+"""
+A rough but fast simulation of cars and the ball for HeadlessArena, so that events can run end to end with
+real bot code and no game client, e.g. to smoke-test event logic or to try out a 64 car derby.
+
+Cars drive on a flat floor inside the field's walls. They have throttle, boost and steering, with roughly the
+speeds and turning circles of Rocket League cars, but no jumping, flipping or bumping. A supersonic car that
+runs into another one demolishes it, and boost pads work. The ball only falls and bounces. None of it tries to
+match the game closely, but given the same seed and the same bots it always plays out the same way.
+
+Bots are loaded from their python files and run in this process, much like rlbot's bot manager would run them,
+taking packets from the arena and talking over the arena's matchcomms. Since cars never leave the floor, events
+must be set up so that they can be played on it, with EVENT_OPTIONS:
+
+    doc = create_competition(competitors, create_events(['WaypointRace', 'DemolitionDerby']), competition_dir)
+    arena = KinematicSimulation(seed=1).attach(HeadlessArena())
+    HeadlessTrackAndField(doc, arena).run_events()
+"""
+
+import ctypes
+import json
+import math
+from typing import Dict, List, Optional, Type
+
+import numpy as np
+from rlbot.agents.base_agent import BaseAgent, BOT_CONFIG_AGENT_HEADER, SimpleControllerState
+from rlbot.utils.class_importer import import_agent
+from rlbot.utils.logging_utils import get_logger
+from rlbot.utils.structures.game_data_struct import BoostPadState, FieldInfoPacket, GameTickPacket
+
+from event_utils.packet_view import PACKET_CAR_DTYPE
+from event_utils.spawn_helper import ActiveBot
+from event import Event
+from headless.headless_arena import HeadlessArena, HeadlessMatchcomms, HeadlessRenderer
+from track_and_field import create_event
+
+# Event constructor options, by event type, that keep events playable without jumping (see create_event).
+EVENT_OPTIONS = {'WaypointRace': {'ground_course': True}}
+
+DEFAULT_GRAVITY = -650
+GROUND_Z = 17.01
+# How far a car's center stays from the side and back walls.
+WALL_X = 4096 - 60
+WALL_Y = 5120 - 60
+
+THROTTLE_ACCEL = 1600
+THROTTLE_TOP_SPEED = 1410
+BRAKE_ACCEL = 3500
+COAST_ACCEL = 525
+BOOST_ACCEL = 991.667
+BOOST_PER_SECOND = 33.3
+MAX_SPEED = 2300
+SUPERSONIC_SPEED = 2200
+# Turning curvature (1 / radius) at a few speeds, interpolated in between.
+CURVATURE_SPEEDS = np.array([0, 500, 1000, 1500, 1750, 2300])
+CURVATURES = np.array([0.0069, 0.00398, 0.00235, 0.001375, 0.0011, 0.00088])
+
+# Cars closer than this are touching.
+CONTACT_DISTANCE = 120
+RESPAWN_SECONDS = 3
+SPAWN_BOOST = 33.3
+# Kickoff spots as (x, y, yaw), where new and respawning cars are placed.
+SPAWN_SPOTS = [(x, y * side, yaw * side) for side in (1, -1) for x, y, yaw in [
+    (-2048, -2560, math.pi / 4), (2048, -2560, 3 * math.pi / 4), (-256, -3840, math.pi / 2),
+    (256, -3840, math.pi / 2), (0, -4608, math.pi / 2)]]
+
+BALL_RADIUS = 92.75
+BALL_RESTITUTION = 0.6
+
+# Standard soccar boost pads as (x, y, z, is_full_boost).
+BOOST_PADS = [
+    (0, -4240, 70, False), (-1792, -4184, 70, False), (1792, -4184, 70, False), (-3072, -4096, 73, True),
+    (3072, -4096, 73, True), (-940, -3308, 70, False), (940, -3308, 70, False), (0, -2816, 70, False),
+    (-3584, -2484, 70, False), (3584, -2484, 70, False), (-1788, -2300, 70, False), (1788, -2300, 70, False),
+    (-2048, -1036, 70, False), (0, -1024, 70, False), (2048, -1036, 70, False), (-3584, 0, 73, True),
+    (-1024, 0, 70, False), (1024, 0, 70, False), (3584, 0, 73, True), (-2048, 1036, 70, False),
+    (0, 1024, 70, False), (2048, 1036, 70, False), (-1788, 2300, 70, False), (1788, 2300, 70, False),
+    (-3584, 2484, 70, False), (3584, 2484, 70, False), (0, 2816, 70, False), (-940, 3310, 70, False),
+    (940, 3308, 70, False), (-3072, 4096, 73, True), (3072, 4096, 73, True), (-1792, 4184, 70, False),
+    (1792, 4184, 70, False), (0, 4240, 70, False)]
+PAD_LOCATIONS = np.array([pad[:3] for pad in BOOST_PADS], dtype=float)
+PAD_IS_FULL = np.array([pad[3] for pad in BOOST_PADS])
+PAD_RADIUS = np.where(PAD_IS_FULL, 208, 144)
+PAD_AMOUNT = np.where(PAD_IS_FULL, 100, 12)
+PAD_RESPAWN_SECONDS = np.where(PAD_IS_FULL, 10, 4)
+
+# A numpy view of the packet's boost pad states. Cars are viewed through PACKET_CAR_DTYPE.
+PAD_DTYPE = np.dtype({
+    'names': ['is_active', 'timer'],
+    'formats': ['?', '<f4'],
+    'offsets': [BoostPadState.is_active.offset, BoostPadState.timer.offset],
+    'itemsize': ctypes.sizeof(BoostPadState)})
+
+
+def field_info() -> FieldInfoPacket:
+    info = FieldInfoPacket()
+    info.num_boosts = len(BOOST_PADS)
+    for pad, (x, y, z, is_full_boost) in zip(info.boost_pads, BOOST_PADS):
+        pad.location.x, pad.location.y, pad.location.z = x, y, z
+        pad.is_full_boost = is_full_boost
+    return info
+
+
+class SimulatedBot:
+    """
+    One bot's agent, running in this process with its own matchcomms queues and renderer.
+    """
+
+    def __init__(self, active_bot: ActiveBot, index: int, agent_class: Type[BaseAgent], field: FieldInfoPacket):
+        bundle = active_bot.bundle
+        config = agent_class.base_create_agent_configurations()
+        config.parse_file(bundle.config_obj, config_directory=bundle.config_directory)
+        self.agent = agent_class(active_bot.name, active_bot.team, index)
+        self.agent._set_spawn_id(active_bot.spawn_id)
+        self.agent.matchcomms_root = 'headless'
+        self.agent._matchcomms = HeadlessMatchcomms()
+        self.agent.load_config(config.get_header(BOT_CONFIG_AGENT_HEADER))
+        self.agent._set_renderer(HeadlessRenderer())
+        self.agent._register_field_info(lambda: field)
+        self.agent.initialize_agent()
+        self.controls = SimpleControllerState()
+        self.errors = 0
+
+    @property
+    def matchcomms(self) -> HeadlessMatchcomms:
+        return self.agent._matchcomms
+
+
+class KinematicSimulation:
+    """
+    A packet script which moves every car and the ball, and runs a bot for every car on the arena's roster.
+    """
+
+    def __init__(self, seed: int = 0, bot_rate: int = 120, friendly_fire: bool = True):
+        """
+        :param seed: Decides where new and respawning cars are placed.
+        :param bot_rate: How many times per second of game time bots are asked for controls. In between,
+        they keep their last controls. Lower is faster, especially with many bots.
+        :param friendly_fire: Whether cars can demolish their team mates, as in a derby.
+        """
+        self.rng = np.random.default_rng(seed)
+        self.bot_rate = bot_rate
+        self.friendly_fire = friendly_fire
+        self.logger = get_logger("Kinematic Simulation")
+        self.arena: Optional[HeadlessArena] = None
+        self.field = field_info()
+        self.agent_classes: Dict[str, Type[BaseAgent]] = {}
+        # Everything below is per car, in the order of the arena's roster.
+        self.bots: List[SimulatedBot] = []
+        self.spawn_ids: List[int] = []
+        self.boost = np.zeros(0)
+        self.respawn_at = np.zeros(0)
+        self.pad_respawn_at = np.zeros(len(BOOST_PADS))
+
+    def attach(self, arena: HeadlessArena) -> HeadlessArena:
+        """
+        Makes the simulation drive the arena. Returns the arena, for convenience.
+        """
+        self.arena = arena
+        arena.packet_script = self
+        arena.roster_listeners.append(self.roster_changed)
+        # The bots here say for themselves which events they support.
+        arena.supported_events = None
+        packet = arena.packet
+        if packet.game_info.world_gravity_z == 0:
+            packet.game_info.world_gravity_z = DEFAULT_GRAVITY
+        packet.num_boosts = len(BOOST_PADS)
+        np.frombuffer(packet.game_boosts, dtype=PAD_DTYPE, count=len(BOOST_PADS))['is_active'] = True
+        self.roster_changed(arena.roster)
+        return arena
+
+    def agent_class(self, python_file: str) -> Type[BaseAgent]:
+        if python_file not in self.agent_classes:
+            self.agent_classes[python_file] = import_agent(python_file).get_loaded_class()
+        return self.agent_classes[python_file]
+
+    def roster_changed(self, roster: List[ActiveBot]):
+        """
+        Keeps each car's state with its bot when the packet indices move around, places new cars at a kickoff
+        spot and starts their bots, and retires the bots whose cars are gone.
+        """
+        packet = self.arena.packet
+        cars = np.frombuffer(packet.game_cars, dtype=PACKET_CAR_DTYPE, count=len(roster))
+        previous = np.frombuffer(packet.game_cars, dtype=PACKET_CAR_DTYPE, count=len(self.spawn_ids)).copy()
+        old_index = {spawn_id: index for index, spawn_id in enumerate(self.spawn_ids)}
+        bots, boost, respawn_at = [], np.zeros(len(roster)), np.zeros(len(roster))
+        for index, active_bot in enumerate(roster):
+            old = old_index.pop(active_bot.spawn_id, None)
+            if old is not None:
+                cars[index] = previous[old]
+                bot = self.bots[old]
+                bot.agent.index = index
+                boost[index], respawn_at[index] = self.boost[old], self.respawn_at[old]
+            else:
+                self.place_at_spawn(cars[index:index + 1])
+                cars[index]['demolitions'] = 0
+                boost[index] = SPAWN_BOOST
+                bot = SimulatedBot(active_bot, index, self.agent_class(active_bot.bundle.python_file), self.field)
+                self.forward_from_bot(bot)
+            bots.append(bot)
+        for old in old_index.values():
+            self.bots[old].agent.retire()
+        self.bots, self.boost, self.respawn_at = bots, boost, respawn_at
+        self.spawn_ids = [active_bot.spawn_id for active_bot in roster]
+        cars['boost'] = np.floor(boost)
+
+    def place_at_spawn(self, cars: np.ndarray):
+        spots = np.array(SPAWN_SPOTS)[self.rng.integers(len(SPAWN_SPOTS), size=len(cars))]
+        physics = cars['physics']
+        physics[:] = 0
+        physics[:, 0, 0], physics[:, 0, 1], physics[:, 0, 2] = spots[:, 0], spots[:, 1], GROUND_Z
+        physics[:, 1, 1] = spots[:, 2]
+        cars['is_demolished'] = False
+        cars['has_wheel_contact'] = True
+        cars['is_super_sonic'] = False
+        cars['physics'] = physics
+
+    def forward_from_bot(self, bot: SimulatedBot):
+        outgoing = bot.matchcomms.outgoing_broadcast
+        while not outgoing.empty():
+            self.arena.matchcomms.incoming_broadcast.put_nowait(outgoing.get_nowait())
+
+    def forward_to_bots(self):
+        outgoing = self.arena.matchcomms.outgoing_broadcast
+        while not outgoing.empty():
+            message = outgoing.get_nowait()
+            # Bots each get their own copy, as they would from a real matchcomms server.
+            text = json.dumps(message)
+            for bot in self.bots:
+                bot.matchcomms.incoming_broadcast.put_nowait(json.loads(text))
+
+    def update_controls(self, packet: GameTickPacket):
+        for bot in self.bots:
+            renderer = bot.agent.renderer
+            renderer.begin_rendering()
+            try:
+                bot.controls = bot.agent.get_output(packet) or SimpleControllerState()
+            except Exception:
+                if bot.errors == 0:
+                    self.logger.exception(f"{bot.agent.name} crashed, it will sit still when it does.")
+                bot.errors += 1
+                bot.controls = SimpleControllerState()
+            renderer.end_rendering()
+            self.forward_from_bot(bot)
+
+    def __call__(self, packet: GameTickPacket, arena: HeadlessArena):
+        self.forward_to_bots()
+        interval = max(1, round(arena.tick_rate / self.bot_rate))
+        if packet.game_info.frame_num % interval == 0:
+            self.update_controls(packet)
+        dt = 1 / arena.tick_rate
+        now = packet.game_info.seconds_elapsed
+        self.step_cars(packet, dt, now)
+        self.step_boost_pads(packet, now)
+        self.step_ball(packet, dt)
+
+    def step_cars(self, packet: GameTickPacket, dt: float, now: float):
+        n = len(self.bots)
+        if n == 0:
+            return
+        cars = np.frombuffer(packet.game_cars, dtype=PACKET_CAR_DTYPE, count=n)
+        # Someone set the boost through game state.
+        changed = cars['boost'] != np.floor(self.boost)
+        self.boost[changed] = cars['boost'][changed]
+
+        respawning = cars['is_demolished'] & (self.respawn_at <= now)
+        if respawning.any():
+            rows = cars[respawning]
+            self.place_at_spawn(rows)
+            cars[respawning] = rows
+            self.boost[respawning] = SPAWN_BOOST
+
+        physics = cars['physics'].astype(float)
+        location, rotation, velocity = physics[:, 0], physics[:, 1], physics[:, 2]
+        alive = ~cars['is_demolished']
+        throttle = np.array([float(getattr(b.controls, 'throttle', 0)) for b in self.bots]).clip(-1, 1)
+        steer = np.array([float(getattr(b.controls, 'steer', 0)) for b in self.bots]).clip(-1, 1)
+        boosting = np.array([bool(getattr(b.controls, 'boost', False)) for b in self.bots]) & (self.boost > 0)
+
+        on_ground = location[:, 2] <= GROUND_Z + 1
+        yaw = rotation[:, 1]
+        speed = velocity[:, 0] * np.cos(yaw) + velocity[:, 1] * np.sin(yaw)
+        throttle = np.where(boosting, 1, throttle)
+        accel = np.where(throttle * speed >= 0,
+                         throttle * THROTTLE_ACCEL * np.clip(1 - np.abs(speed) / THROTTLE_TOP_SPEED, 0, 1),
+                         np.sign(throttle) * BRAKE_ACCEL)
+        accel = np.where(throttle == 0, -np.sign(speed) * np.minimum(COAST_ACCEL, np.abs(speed) / dt), accel)
+        accel += boosting * BOOST_ACCEL
+        speed = np.clip(speed + accel * dt, -MAX_SPEED, MAX_SPEED)
+        yaw_rate = steer * np.interp(np.abs(speed), CURVATURE_SPEEDS, CURVATURES) * speed
+        yaw = (yaw + yaw_rate * dt + math.pi) % (2 * math.pi) - math.pi
+
+        ground = on_ground & alive
+        air = ~on_ground & alive
+        velocity[ground, 0] = (np.cos(yaw) * speed)[ground]
+        velocity[ground, 1] = (np.sin(yaw) * speed)[ground]
+        velocity[ground, 2] = 0
+        velocity[air, 2] += packet.game_info.world_gravity_z * dt
+        location[alive] += velocity[alive] * dt
+        landed = alive & (location[:, 2] < GROUND_Z)
+        location[landed, 2] = GROUND_Z
+        velocity[landed, 2] = 0
+        for axis, wall in ((0, WALL_X), (1, WALL_Y)):
+            hit = alive & (np.abs(location[:, axis]) > wall)
+            location[hit, axis] = np.clip(location[hit, axis], -wall, wall)
+            velocity[hit, axis] = 0
+        rotation[ground, 0] = 0
+        rotation[ground, 1] = yaw[ground]
+        rotation[ground, 2] = 0
+        physics[ground, 3] = 0
+        physics[ground, 3, 2] = yaw_rate[ground]
+        self.boost = np.where(boosting & alive, np.maximum(self.boost - BOOST_PER_SECOND * dt, 0), self.boost)
+
+        # Falling cars are capped too, or anything parked up high comes down faster than any car can drive.
+        norm = np.linalg.norm(velocity, axis=1)
+        too_fast = alive & (norm > MAX_SPEED)
+        velocity[too_fast] *= (MAX_SPEED / norm[too_fast])[:, None]
+        norm[too_fast] = MAX_SPEED
+
+        # Only a car driving on the ground can demolish, not one that's been set down somewhere out of the way.
+        wheel_contact = alive & (location[:, 2] <= GROUND_Z + 1)
+        supersonic = wheel_contact & (norm >= SUPERSONIC_SPEED)
+        self.demolish(packet, cars, location, velocity, supersonic, alive, now)
+
+        cars['physics'] = physics
+        cars['has_wheel_contact'] = wheel_contact
+        cars['is_super_sonic'] = supersonic
+        cars['boost'] = np.floor(self.boost)
+
+    def demolish(self, packet: GameTickPacket, cars: np.ndarray, location: np.ndarray, velocity: np.ndarray,
+                 supersonic: np.ndarray, alive: np.ndarray, now: float):
+        """
+        A supersonic car demolishes every car it's driving into. Two supersonic cars meeting head on both go.
+        """
+        offsets = location[None, :, :] - location[:, None, :]  # [attacker, victim]
+        touching = (offsets ** 2).sum(axis=2) < CONTACT_DISTANCE ** 2
+        approaching = (velocity[:, None, :] * offsets).sum(axis=2) > 0
+        hits = touching & approaching & supersonic[:, None] & alive[None, :]
+        np.fill_diagonal(hits, False)
+        if not self.friendly_fire:
+            teams = np.array([packet.game_cars[i].team for i in range(len(cars))])
+            hits &= teams[:, None] != teams[None, :]
+        victims = hits.any(axis=0)
+        if not victims.any():
+            return
+        # Each victim is credited to one attacker, the first one in packet order.
+        attackers = hits[:, victims].argmax(axis=0)
+        cars['demolitions'] += np.bincount(attackers, minlength=len(cars)).astype(np.int32)
+        cars['is_demolished'] |= victims
+        velocity[victims] = 0
+        self.respawn_at[victims] = now + RESPAWN_SECONDS
+
+    def step_boost_pads(self, packet: GameTickPacket, now: float):
+        pads = np.frombuffer(packet.game_boosts, dtype=PAD_DTYPE, count=len(BOOST_PADS))
+        back = ~pads['is_active'] & (self.pad_respawn_at <= now)
+        pads['is_active'] |= back
+        n = len(self.bots)
+        if n > 0:
+            cars = np.frombuffer(packet.game_cars, dtype=PACKET_CAR_DTYPE, count=n)
+            location = cars['physics'][:, 0].astype(float)
+            can_take = (~cars['is_demolished'] & (self.boost < 100))[:, None] & pads['is_active'][None, :]
+            in_reach = ((location[:, None, :] - PAD_LOCATIONS[None, :, :]) ** 2).sum(axis=2) < PAD_RADIUS ** 2
+            taking = can_take & in_reach
+            taken = taking.any(axis=0)
+            if taken.any():
+                # A pad goes to the first car in packet order that reaches it.
+                takers = taking[:, taken].argmax(axis=0)
+                np.add.at(self.boost, takers, PAD_AMOUNT[taken])
+                self.boost = np.minimum(self.boost, 100)
+                cars['boost'] = np.floor(self.boost)
+                pads['is_active'] &= ~taken
+                self.pad_respawn_at[taken] = now + PAD_RESPAWN_SECONDS[taken]
+        pads['timer'] = np.where(pads['is_active'], 0, np.maximum(self.pad_respawn_at - now, 0))
+
+    def step_ball(self, packet: GameTickPacket, dt: float):
+        physics = packet.game_ball.physics
+        location, velocity = physics.location, physics.velocity
+        # Events hide the ball under the floor. It stays there.
+        if location.z < 0:
+            return
+        velocity.z += packet.game_info.world_gravity_z * dt
+        location.x += velocity.x * dt
+        location.y += velocity.y * dt
+        location.z += velocity.z * dt
+        if location.z < BALL_RADIUS:
+            location.z = BALL_RADIUS
+            velocity.z = -velocity.z * BALL_RESTITUTION
+        for axis, wall in (('x', 4096 - BALL_RADIUS), ('y', 5120 - BALL_RADIUS)):
+            if abs(getattr(location, axis)) > wall:
+                setattr(location, axis, math.copysign(wall, getattr(location, axis)))
+                setattr(velocity, axis, -getattr(velocity, axis) * BALL_RESTITUTION)
+
+
+def kinematic_arena(seed: int = 0, bot_rate: int = 120, tick_rate: int = 120) -> HeadlessArena:
+    """
+    A fresh arena driven by a KinematicSimulation. Being a module level function, this works as the arena
+    factory for headless.shard_coordinator, e.g. with functools.partial(kinematic_arena, seed=3).
+    """
+    return KinematicSimulation(seed=seed, bot_rate=bot_rate).attach(HeadlessArena(tick_rate=tick_rate))
+
+
+def create_events(event_types: List[str]) -> List[Event]:
+    """
+    New events of the given types, set up with EVENT_OPTIONS for the simulation.
+    """
+    return [create_event(t, **EVENT_OPTIONS.get(t, {})) for t in event_types]
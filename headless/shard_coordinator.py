@@ -0,0 +1,107 @@
+"""
+Splits an event's competitors across several headless arenas, each in its own process, and merges what
+they come up with back into the event's document.
+
+Every shard gets a copy of the event document with only its share of the competitors, next to the original,
+e.g. WaypointRace.shard0.json. The shards run the event like any other competition, and as each one finishes,
+its results are journalled into the original document. Competitors that already have a result are left out.
+
+Each shard's arena has its own game clock, so a competitor's run records (e.g. start_time) only make sense
+alongside that shard's recordings and profile, e.g. WaypointRace.shard0.trajectory. The merged document's
+"shards" field says which shard document each competitor ran in, by config path.
+
+The arenas come from a factory, which has to be picklable (e.g. a module level function), because it's
+called in the worker process:
+
+    def make_arena() -> HeadlessArena:
+        return HeadlessArena(packet_script=my_simulation, supported_events=['WaypointRace'])
+
+    run_sharded(event_meta, make_arena, num_shards=8)
+"""
+
+import copy
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from event import EventMeta
+from event_utils.doc_journal import DocumentJournal
+from headless.headless_arena import HeadlessArena
+
+ArenaFactory = Callable[[], HeadlessArena]
+
+
+def is_result_field(name: str) -> bool:
+    """
+    Which top level fields of an event document hold per-competitor outcomes, and get merged.
+    """
+    return name.startswith('result_') or name == 'runs'
+
+
+def competitors_lacking_results(state: Dict) -> List[str]:
+    have_results = set()
+    for name, value in state.items():
+        if is_result_field(name) and isinstance(value, dict):
+            have_results.update(value)
+    return [path for path in state['competitor_cfg_files'] if path not in have_results]
+
+
+def shard_path(doc_path: Path, index: int) -> Path:
+    return doc_path.with_name(f"{doc_path.stem}.shard{index}{doc_path.suffix}")
+
+
+def run_shard(event_type: str, doc_path: str, arena_factory: ArenaFactory, record_trajectories=False) -> str:
+    """
+    Runs one shard's event in a fresh arena. This is what each worker process does.
+    """
+    # Imported here so that the coordinating process doesn't need the script's dependencies loaded up front.
+    from headless.headless_track_and_field import HeadlessTrackAndField
+    from track_and_field import CompetitionDocument
+
+    state = DocumentJournal(Path(doc_path)).load_state()
+    event_meta = EventMeta(event_type=event_type, event_doc_path=doc_path)
+    doc = CompetitionDocument(state['competitor_cfg_files'], [event_meta])
+    HeadlessTrackAndField(doc, arena_factory(), record_trajectories).run_events()
+    return doc_path
+
+
+def run_sharded(event_meta: EventMeta, arena_factory: ArenaFactory, num_shards: int,
+                record_trajectories=False) -> Dict:
+    """
+    Runs the event's outstanding competitors over up to num_shards arenas at once, then returns the merged
+    event document as a dict. Competitors are dealt out in turn, so neighbours in the list land in different
+    shards.
+    """
+    doc_path = Path(event_meta.event_doc_path)
+    journal = DocumentJournal(doc_path)
+    state = journal.load_state()
+    outstanding = competitors_lacking_results(state)
+    shards = [outstanding[i::num_shards] for i in range(min(num_shards, len(outstanding)))]
+
+    shard_paths = []
+    for index, competitors in enumerate(shards):
+        shard_state = copy.deepcopy(state)
+        shard_state['competitor_cfg_files'] = competitors
+        path = shard_path(doc_path, index)
+        DocumentJournal(path).create(shard_state)
+        shard_paths.append(path)
+
+    if shard_paths:
+        with ProcessPoolExecutor(max_workers=len(shard_paths)) as pool:
+            futures = [pool.submit(run_shard, event_meta.event_type, str(path), arena_factory, record_trajectories)
+                       for path in shard_paths]
+            failures = []
+            for future in as_completed(futures):
+                try:
+                    path = future.result()
+                except Exception as e:
+                    failures.append(e)
+                    continue
+                shard_state = DocumentJournal(Path(path)).load_state()
+                patch = {name: value for name, value in shard_state.items() if is_result_field(name)}
+                patch['shards'] = {competitor: Path(path).name for competitor in shard_state['competitor_cfg_files']}
+                journal.record(patch)
+        journal.compact()
+        if failures:
+            raise failures[0]
+    return journal.state
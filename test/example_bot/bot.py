@@ -26,7 +26,8 @@ class MyBot(BaseAgent):
         self.boost_pad_tracker.initialize_boosts(self.get_field_info())
 
         # Now we set up a json to let Track and Field know we can play waypointrace and are ready to go, then send it.
-        message = {"readyForTrackAndField": True, "supportedEvents": ["WaypointRace", "DemolitionDerby"]}
+        message = {"readyForTrackAndField": True, "supportedEvents": ["WaypointRace", "DemolitionDerby"],
+                   "spawn_id": self.spawn_id, "name": self.name}
         self.matchcomms.outgoing_broadcast.put_nowait(message)
 
     def get_output(self, packet: GameTickPacket) -> SimpleControllerState:
@@ -38,7 +39,10 @@ class MyBot(BaseAgent):
             message = self.matchcomms.incoming_broadcast.get_nowait()  # Try to get all of the data from Track and Field
             if message.get("event_type") == 'WaypointRace':
                 print("Got waypoints, starting up now!")  # We have the waypoints now, lets start this thing up!
-                waypoints = [Vec3(w['x'], w['y'], w['z']) for w in message["waypoints"]]
+                # In a heat, each car has its own lane. Find ours by spawn id.
+                my_spawn_id = packet.game_cars[self.index].spawn_id
+                lane = next((l for l in message.get("lanes", []) if l["spawn_id"] == my_spawn_id), message)
+                waypoints = [Vec3(w['x'], w['y'], w['z']) for w in lane["waypoints"]]
                 waypoint_tolerance = message["waypoint_tolerance"]
                 self.active_sequence = Sequence([
                     RunWaypointRace(waypoints, waypoint_tolerance, self)
@@ -1,30 +1,47 @@
+# Imported first, so that the startup report can tell how long the imports below take.
+from event_utils.startup_timer import startup
+
 import signal
+import sqlite3
+import sys
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 from mashumaro import DataClassJSONMixin
 from rlbot.agents.base_script import BaseScript
-from rlbot.parsing.bot_config_bundle import get_bot_config_bundle
-from rlbot_gui.gui import get_team_settings
+from rlbot.utils.structures.game_data_struct import GameTickPacket
 
-from competitor import Competitor
+from competitor import Competitor, load_bundles
 from event import Event, EventMeta
-from event_utils.spawn_helper import SpawnHelper
-from events.demolition_derby import DemolitionDerby
-from events.waypoint_race import WaypointRace
+from event_utils.doc_journal import write_atomically
+from event_utils.spawn_helper import SpawnHelper, wait_until, DESPAWN_TIMEOUT
+from event_utils.results_store import DB_FILE, ResultsStore
+from event_utils.tick_profiler import profiler
+from event_utils.trajectory_recorder import TrajectoryRecorder
 from ui.on_screen_log import OnScreenLog
-from ui.wait_for_press import KeyWaiter
+from ui.render_scheduler import RenderScheduler, render_scheduler
+from ui.wait_for_press import Prompter, key_input
+
+startup.record('imports', time.perf_counter() - startup.started)
+
+
+# How long the match should have been running before we clear out the bots that RLBotGUI started.
+# Counted from the start of the match, so it includes the kickoff countdown.
+BOT_SIGHTING_SECONDS = 4.5
+ROUND_START_TIMEOUT = 10
 
 
 def load_competitors() -> List[Competitor]:
     # Loads the bots used in the most recently launched match from RLBotGUI.
+    # Imported here because rlbot_gui drags in a GUI toolkit, which headless runs don't have.
+    from rlbot_gui.gui import get_team_settings
     team_settings = get_team_settings()
     blue_settings: List[Dict] = team_settings['blue_team']
     orange_settings: List[Dict] = team_settings['orange_team']
     all_settings = blue_settings + orange_settings
-    all_bundles = [get_bot_config_bundle(d["path"]) for d in all_settings if "path" in d]
+    all_bundles = load_bundles([d["path"] for d in all_settings if "path" in d])
     return [Competitor(b) for b in all_bundles]
 
 
@@ -37,15 +54,45 @@ class CompetitionDocument(DataClassJSONMixin):
 # Extending the BaseScript class is purely optional. It's just convenient / abstracts you away from
 # some strange classes like GameInterface
 class TrackAndField(BaseScript):
-    def __init__(self, doc: CompetitionDocument):
-        super().__init__("Track and Field")
+    # Where results go as each event completes, if anywhere. See event_utils/results_store.py.
+    results_store: Optional[ResultsStore] = None
+    # Where the competition document is saved, so completed events can be marked in it.
+    competition_file: Optional[Path] = None
+
+    def __init__(self, doc: CompetitionDocument, record_trajectories=False, results_store: ResultsStore = None,
+                 competition_file: Path = None):
+        with startup.phase('connect'):
+            super().__init__("Track and Field")
+        self.results_store = results_store
+        self.start_competition(doc, SpawnHelper(self.game_interface), record_trajectories, competition_file)
+
+    def start_competition(self, doc: CompetitionDocument, spawn_helper: SpawnHelper, record_trajectories=False,
+                          competition_file: Path = None):
+        """
+        Everything that needs a game to talk to, split out of __init__ so that stand-in arenas
+        (see headless/) can supply their own game interface and spawn helper.
+        """
+        self.record_trajectories = record_trajectories
+        self.competition_file = competition_file
+        self.recorder: TrajectoryRecorder = None
+        profiler.instrument_renderer(self.renderer)
+        self.render_scheduler: RenderScheduler = render_scheduler(self.renderer)
         self.on_screen_log = OnScreenLog(self.renderer, 4, 20, 20, 2, self.renderer.yellow())
         self.on_screen_log.log("Welcome to Track and Field!")
-        self.spawn_helper = SpawnHelper(self.game_interface)
+        self.spawn_helper = spawn_helper
         self.competition_document = doc
-        self.wait_for_game_stabilization()
-        self.events: List[Event] = [self.construct_and_load(d) for d in doc.event_documents]
+        with startup.phase('game_stabilization'):
+            self.wait_for_game_stabilization()
+        with startup.phase('load_events'):
+            # Completed events are skipped without reading their documents.
+            self.events: List[Event] = [self.construct_and_load(d) for d in doc.event_documents if not d.is_complete]
+        num_complete = len(doc.event_documents) - len(self.events)
+        if num_complete:
+            self.on_screen_log.log(f"Skipping {num_complete} events that are already complete.")
         self.event_index = 0
+        self.active_event: Event = None
+        self.event_is_confirmed = False
+        self.prompter = Prompter(self.renderer)
         # The signal handling doesn't seem to work for me :(
         signal.signal(signal.SIGTERM, self.exit_gracefully)
 
@@ -54,92 +101,183 @@ class TrackAndField(BaseScript):
 
     def exit_gracefully(self):
         self.logger.info("Exiting gracefully.")
+        key_input.stop()
         self.renderer.clear_all_touched_render_groups()
+        self.render_scheduler.forget()
 
     def wait_for_game_stabilization(self):
         """
         Bots will be waiting to see their own spawn_id in the packet. Once they see it once, they'll be ready
         to retire when it disappears / when the car de-spawns. Wait for long enough to make sure they see it.
+        When the script restarts during a match that's been running for a while, that's already the case.
         """
-        for _ in range(20):
-            packet = self.get_game_tick_packet()
-            if packet.game_info.is_round_active:
-                time.sleep(1.5)
-                self.on_screen_log.log("Clearing bots to prepare for track and field.")
-                self.spawn_helper.clear_bots()
-                self.on_screen_log.log("Bots cleared, waiting for processes to die...")
-                time.sleep(3)
-                break
-            time.sleep(.5)
+        def bots_have_seen_their_cars():
+            game_info = self.get_game_tick_packet().game_info
+            return game_info.is_round_active and game_info.seconds_elapsed >= BOT_SIGHTING_SECONDS
+
+        if not wait_until(bots_have_seen_their_cars, ROUND_START_TIMEOUT):
+            return
+        self.on_screen_log.log("Clearing bots to prepare for track and field.")
+        self.spawn_helper.clear_bots()
+        self.on_screen_log.log("Bots cleared, waiting for their cars to disappear...")
+        self.render_scheduler.flush()  # Nothing ticks while we wait.
+        wait_until(lambda: self.get_game_tick_packet().num_cars == 0, DESPAWN_TIMEOUT)
 
     def construct_event(self, event_type: str) -> Event:
-        if event_type == 'WaypointRace':
-            return WaypointRace()
-        if event_type == 'DemolitionDerby':
-            return DemolitionDerby()
+        return create_event(event_type)
 
     def construct_and_load(self, event_doc: EventMeta) -> Event:
         event = self.construct_event(event_doc.event_type)
         event.load_event(event_doc, self.spawn_helper, self.game_interface)
         return event
 
-    def run(self):
+    def wait_for_press(self, key: str, action_description: str) -> bool:
+        """
+        Shows a prompt until the key is pressed, without blocking. See Event.wait_for_press.
+        """
+        return self.prompter.wait_for_press(key, action_description)
+
+    def run_events(self):
+        """
+        Runs the competition's remaining events, one after the other.
+        """
         self.on_screen_log.log(f"Running {len(self.events)} track and field events...")
-        active_event: Event = None
-        while True:
-            packet = self.wait_game_tick_packet()
-
-            if active_event is None:
-                if self.event_index >= len(self.events):
-                    self.on_screen_log.log("Finished all Track and Field events!")
-                    KeyWaiter().wait_for_press('q', 'quit', self.renderer)
-                    self.exit_gracefully()
-                    exit(0)
-                active_event = self.events[self.event_index]
-                self.on_screen_log.log(f"Event: {active_event.name}")
-                KeyWaiter().wait_for_press('j', f'proceed to {active_event.name}', self.renderer)
-
-            event_status = active_event.tick_event(packet)
-            if event_status.is_complete:
-                self.event_index += 1
-                active_event = None
+        while self.event_index < len(self.events):
+            with profiler.span('packet_wait'):
+                packet = self.wait_game_tick_packet()
+            self.tick(packet)
+            # Everything drawn during the tick goes out once, and only where it changed.
+            with profiler.span('render_flush'):
+                self.render_scheduler.flush()
+        self.on_screen_log.log("Finished all Track and Field events!")
+
+    def run(self):
+        self.run_events()
+        while not self.wait_for_press('q', 'quit'):
+            self.render_scheduler.flush()
+            self.wait_game_tick_packet()
+        self.exit_gracefully()
+
+    def tick(self, packet: GameTickPacket):
+        if self.active_event is None:
+            self.active_event = self.events[self.event_index]
+            self.active_event.activate()
+            self.on_screen_log.log(f"Event: {self.active_event.name}")
+            self.event_is_confirmed = False
+        if not self.event_is_confirmed:
+            self.event_is_confirmed = self.wait_for_press('j', f'proceed to {self.active_event.name}')
+            if not self.event_is_confirmed:
+                return
+            # Time spent at the prompt isn't part of the event.
+            profiler.reset()
+            if self.record_trajectories:
+                self.recorder = TrajectoryRecorder(self.active_event.trajectory_path())
+
+        if self.recorder is not None:
+            with profiler.span('record_trajectory'):
+                self.recorder.record(packet)
+                if self.recorder.unlabeled:
+                    self.recorder.label(self.spawn_helper.active_bots, packet)
+        profiler.count('ticks')
+        with profiler.span('packet_view'):
+            self.active_event.packet_view.update(packet)
+        with profiler.span('tick_event'):
+            event_status = self.active_event.tick_event(packet)
+        self.spawn_helper.park_idle(self.active_event.state_batcher)
+        # Everything the event wanted to set during this tick goes out as one game state.
+        self.active_event.state_batcher.flush(packet)
+        if event_status.is_complete:
+            profiler.write_report(self.active_event.profile_path())
+            if self.results_store is not None:
+                self.store_results(self.active_event)
+            self.mark_complete(self.active_event)
+            if self.recorder is not None:
+                self.recorder.close()
+                self.recorder = None
+            self.event_index += 1
+            self.active_event = None
+
+    def mark_complete(self, event: Event):
+        event.event_meta.is_complete = True
+        if self.competition_file is not None:
+            write_atomically(self.competition_file, self.competition_document.to_json())
+
+    def store_results(self, event: Event):
+        # The event document has the results already, so a database problem shouldn't stop the competition.
+        try:
+            self.results_store.ingest(event.event_meta.event_type, Path(event.event_meta.event_doc_path))
+        except sqlite3.Error:
+            self.logger.exception(f"Couldn't add the results of {event.name} to {self.results_store.db_path}.")
+
+
+def create_event(event_type: str, **options) -> Event:
+    """
+    Makes a new event of the given type. Options go to the event's constructor, e.g. heat_size for WaypointRace.
+    """
+    # Event modules are imported when first needed, to keep startup quick.
+    if event_type == 'WaypointRace':
+        from events.waypoint_race import WaypointRace
+        return WaypointRace(**options)
+    if event_type == 'DemolitionDerby':
+        from events.demolition_derby import DemolitionDerby
+        return DemolitionDerby(**options)
+    raise ValueError(f"Unknown event type {event_type}.")
+
+
+def create_competition(competitors: List[Competitor], events: List[Event],
+                       competition_dir: Path) -> CompetitionDocument:
+    """
+    Sets up a new competition's folder, with a document for each event.
+    """
+    competition_dir.mkdir(parents=True, exist_ok=True)
+    event_docs = [e.init_event(competitors, competition_dir) for e in events]
+    return CompetitionDocument([c.bundle.config_path for c in competitors], event_docs)
 
 
 def get_event_list():
     """
     These are the track and field events which will be initialized for new competitions.
     """
+    from events.demolition_derby import DemolitionDerby
+    from events.waypoint_race import WaypointRace
     return [WaypointRace(), DemolitionDerby()]
 
 
 if __name__ == "__main__":
-    competitors: List[Competitor] = load_competitors()
+    with startup.phase('load_competitors'):
+        competitors: List[Competitor] = load_competitors()
 
     data_dir = Path(__file__).parent / "data"
     current_competition_file = data_dir / "current_competition.json"
-    if current_competition_file.exists():
-
-        # Load the file
-        print(f"Current competition file already exists at {current_competition_file.absolute()}")
-        doc = CompetitionDocument.from_json(current_competition_file.read_text())
-
-        if len(competitors) > 0:
-            comp_config_files = [k.bundle.config_path for k in competitors]
-            if doc.competitor_cfg_files != comp_config_files:
-                raise ValueError(f"Competitors from RLBotGUI ({comp_config_files}) do not match competitors in doc"
-                                 f" ({doc.competitor_cfg_files}). If you want to start fresh, remove or rename"
-                                 f" {current_competition_file.absolute()}")
-    else:
-        events = get_event_list()
-        time_str = time.strftime("%Y-%m-%dT%H-%M-%S")
-        competition_dir = data_dir / time_str
-        competition_dir.mkdir(parents=True, exist_ok=True)
-        event_docs = [e.init_event(competitors, competition_dir) for e in events]
-
-        doc = CompetitionDocument([c.bundle.config_path for c in competitors], event_docs)
-        # Save a current competition file here
-        current_competition_file.write_text(doc.to_json())
+    with startup.phase('load_document'):
+        if current_competition_file.exists():
+
+            # Load the file
+            print(f"Current competition file already exists at {current_competition_file.absolute()}")
+            doc = CompetitionDocument.from_json(current_competition_file.read_text())
+
+            if len(competitors) > 0:
+                comp_config_files = [k.bundle.config_path for k in competitors]
+                if doc.competitor_cfg_files != comp_config_files:
+                    raise ValueError(f"Competitors from RLBotGUI ({comp_config_files}) do not match competitors in doc"
+                                     f" ({doc.competitor_cfg_files}). If you want to start fresh, remove or rename"
+                                     f" {current_competition_file.absolute()}")
+        else:
+            time_str = time.strftime("%Y-%m-%dT%H-%M-%S")
+            doc = create_competition(competitors, get_event_list(), data_dir / time_str)
+            # Save a current competition file here
+            current_competition_file.write_text(doc.to_json())
 
     # Run the competition
-    track_and_field = TrackAndField(doc)
+    # Prompts can also be answered by appending the key to data/control.txt, or through a local socket.
+    key_input.watch_file(data_dir / "control.txt")
+    if '--control-socket' in sys.argv:
+        key_input.listen_on_socket()
+    track_and_field = TrackAndField(doc, record_trajectories='--record' in sys.argv,
+                                    results_store=ResultsStore(data_dir / DB_FILE),
+                                    competition_file=current_competition_file)
+    if '--startup-report' in sys.argv:
+        startup.write_report(data_dir / "startup_report.json")
+        track_and_field.logger.info(startup.summary())
     track_and_field.run()
+    exit(0)
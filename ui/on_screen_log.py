@@ -1,12 +1,16 @@
-from typing import List
+from collections import deque
+from typing import Deque
 
 from rlbot.utils.rendering.rendering_manager import RenderingManager
 
+from ui.render_scheduler import render_scheduler, text_2d
+
 
 class OnScreenLog:
     def __init__(self, renderer: RenderingManager, num_lines: int, screen_x: int, screen_y: int, scale: int, color):
-        self.screen_log: List[str] = []
+        self.screen_log: Deque[str] = deque(maxlen=num_lines)
         self.renderer = renderer
+        self.scheduler = render_scheduler(renderer)
         self.num_lines = num_lines
         self.screen_x = screen_x
         self.screen_y = screen_y
@@ -17,15 +21,10 @@ class OnScreenLog:
     def log(self, text: str):
         self.screen_log.append(text)
         print(f"[Screen Log] {text}")
-        while len(self.screen_log) > self.num_lines:
-            self.screen_log = self.screen_log[1:]
-        self._render()
+        # Shows up when the frame is flushed, however many lines were logged during it.
+        self.scheduler.show(self.render_group, text_2d(self.screen_x, self.screen_y, self.scale,
+                                                       "\n".join(self.screen_log), self.color))
 
     def clear(self):
-        self.screen_log = []
-        self.renderer.clear_screen(self.render_group)
-
-    def _render(self):
-        self.renderer.begin_rendering(self.render_group)
-        self.renderer.draw_string_2d(self.screen_x, self.screen_y, self.scale, self.scale, "\n".join(self.screen_log), self.color)
-        self.renderer.end_rendering()
+        self.screen_log.clear()
+        self.scheduler.clear(self.render_group)
@@ -0,0 +1,62 @@
+from typing import Dict, List, Optional, Tuple
+
+from rlbot.utils.rendering.rendering_manager import RenderingManager
+
+from event_utils.tick_profiler import profiler
+
+# A renderer draw call, as the method name followed by its arguments, e.g. ('draw_string_2d', 20, 20, 1, 1, 'hi', color).
+Draw = Tuple
+
+
+def text_2d(x: int, y: int, scale: int, text: str, color) -> Draw:
+    return 'draw_string_2d', x, y, scale, scale, text, color
+
+
+class RenderScheduler:
+    """
+    Collects what each render group should show during a frame, then sends the groups whose content changed,
+    once per frame. Groups keep showing their last content until something shows or clears them again, so
+    drawing the same thing every tick costs nothing, and when several things draw into one group during a
+    frame, the last one wins.
+    """
+
+    def __init__(self, renderer: RenderingManager):
+        self.renderer = renderer
+        self.frame: Dict[str, List[Draw]] = {}
+        # What each group was last sent with. Groups missing here may show anything, e.g. from an earlier run.
+        self.on_screen: Dict[str, List[Draw]] = {}
+
+    def show(self, group: str, *draws: Draw):
+        self.frame[group] = list(draws)
+
+    def clear(self, group: str):
+        self.frame[group] = []
+
+    def flush(self):
+        for group, draws in self.frame.items():
+            if self.on_screen.get(group) == draws:
+                profiler.count('render_groups_unchanged')
+                continue
+            self.renderer.begin_rendering(group)
+            for method, *args in draws:
+                getattr(self.renderer, method)(*args)
+            self.renderer.end_rendering()
+            self.on_screen[group] = draws
+            profiler.count('render_groups_sent')
+        self.frame = {}
+
+    def forget(self):
+        """
+        For when the screen was changed behind the scheduler's back, e.g. by clear_all_touched_render_groups.
+        """
+        self.on_screen = {}
+
+
+def render_scheduler(renderer: RenderingManager) -> RenderScheduler:
+    """
+    The scheduler shared by everything that draws through this renderer.
+    """
+    scheduler: Optional[RenderScheduler] = getattr(renderer, 'render_scheduler', None)
+    if scheduler is None:
+        scheduler = renderer.render_scheduler = RenderScheduler(renderer)
+    return scheduler
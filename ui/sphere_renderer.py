@@ -0,0 +1,108 @@
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+from rlbot.utils.rendering.rendering_manager import RenderingManager
+
+# Segments per circle, from closest to furthest from the viewer.
+DETAIL_LEVELS = [16, 8, 4]
+# Spheres further than this from the viewer drop to the next level of detail.
+DETAIL_DISTANCES = [2500, 6000]
+# Keeps each render message comfortably under RLBot's size limit.
+MAX_LINES_PER_GROUP = 500
+# When a frame would draw more lines than this, every sphere drops a level of detail until it fits.
+MAX_LINES_PER_FRAME = 4000
+
+
+@lru_cache(maxsize=None)
+def circle_templates(num_pts: int) -> np.ndarray:
+    """
+    Returns a (2, num_pts + 1, 3) array holding a unit circle around the z axis and one around the y axis,
+    each closed by repeating its first point.
+    """
+    angles = 2 * np.pi * np.arange(num_pts + 1) / num_pts
+    sin, cos, zero = np.sin(angles), np.cos(angles), np.zeros(num_pts + 1)
+    templates = np.stack([np.stack([sin, cos, zero], axis=1), np.stack([sin, zero, cos], axis=1)])
+    templates.flags.writeable = False
+    return templates
+
+
+def sphere_polylines(center, radius: float, num_pts: int = DETAIL_LEVELS[0]) -> List[List[List[float]]]:
+    """
+    Returns the equator and vertical circle of a sphere as lists of points, ready for draw_polyline_3d.
+    """
+    return (circle_templates(num_pts) * radius + np.asarray(center, dtype=np.float64)).tolist()
+
+
+class SphereRenderer:
+    """
+    Collects spheres during a tick and draws them all at once, with fewer segments on far away spheres.
+    Draws are split over as many render groups as it takes to keep each message small.
+    """
+
+    def __init__(self, renderer: RenderingManager, group_id: str):
+        self.renderer = renderer
+        self.group_id = group_id
+        self.batches: List[Tuple[np.ndarray, float, object]] = []
+        self.groups_drawn = 0
+
+    def add(self, centers, radius: float, color):
+        """
+        Queues spheres of the same radius and color. centers can be anything shaped like (n, 3), or a single point.
+        """
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+        if len(centers):
+            self.batches.append((centers, radius, color))
+
+    def _detail_indices(self, viewer) -> List[np.ndarray]:
+        if viewer is None:
+            indices = [np.zeros(len(centers), dtype=np.int64) for centers, _, _ in self.batches]
+        else:
+            viewer = np.asarray(viewer, dtype=np.float64)
+            indices = [np.searchsorted(DETAIL_DISTANCES, np.linalg.norm(centers - viewer, axis=1))
+                       for centers, _, _ in self.batches]
+
+        levels = np.array(DETAIL_LEVELS)
+        for _ in DETAIL_LEVELS:
+            total_lines = sum(2 * levels[i].sum() for i in indices)
+            if total_lines <= MAX_LINES_PER_FRAME:
+                break
+            indices = [np.minimum(i + 1, len(DETAIL_LEVELS) - 1) for i in indices]
+        return indices
+
+    def _group_name(self, n: int) -> str:
+        return self.group_id if n == 0 else f"{self.group_id}_{n}"
+
+    def flush(self, viewer=None):
+        """
+        Draws everything queued since the last flush. The viewer is the point that level of detail is
+        measured from; without one, every sphere gets full detail unless the frame is too busy.
+        """
+        groups = 0
+        lines_in_group = 0
+        self.renderer.begin_rendering(self._group_name(groups))
+        for (centers, radius, color), detail in zip(self.batches, self._detail_indices(viewer)):
+            for level in np.unique(detail):
+                num_pts = DETAIL_LEVELS[level]
+                circles = circle_templates(num_pts) * radius + centers[detail == level, None, None, :]
+                for polyline in circles.reshape(-1, num_pts + 1, 3).tolist():
+                    if lines_in_group + num_pts > MAX_LINES_PER_GROUP:
+                        self.renderer.end_rendering()
+                        groups += 1
+                        lines_in_group = 0
+                        self.renderer.begin_rendering(self._group_name(groups))
+                    self.renderer.draw_polyline_3d(polyline, color)
+                    lines_in_group += num_pts
+        self.renderer.end_rendering()
+        groups += 1
+
+        for n in range(groups, self.groups_drawn):
+            self.renderer.clear_screen(self._group_name(n))
+        self.groups_drawn = groups
+        self.batches = []
+
+    def clear(self):
+        self.batches = []
+        for n in range(max(self.groups_drawn, 1)):
+            self.renderer.clear_screen(self._group_name(n))
+        self.groups_drawn = 0
@@ -1,38 +1,184 @@
-import time
+"""
+Prompts that wait for a key press without blocking the tick loop.
+
+Key presses come from a single keyboard listener that lives as long as the script, and can also be sent
+from outside: through a local control socket (one key per line, e.g. `echo k | nc localhost 23234`)
+or a control file (append a line with the key).
+"""
+
+import socketserver
+import threading
+from pathlib import Path
+from typing import Optional, Set
 
-from pynput import keyboard
 from rlbot.utils.rendering.rendering_manager import RenderingManager
 
+from ui.render_scheduler import render_scheduler, text_2d
+
+# Used when the control socket is turned on without a port.
+CONTROL_PORT = 23234
+RENDER_GROUP = "wait_for_press"
+
 
-class KeyWaiter:
+class KeyInput:
+    """
+    Collects key presses from every source. A press stays pending until a prompt for that key takes it.
+    """
 
     def __init__(self):
-        self.desired_key_press: str = None
-        self.action_description: str = None
-        self.done = False
+        self.pending: Set[str] = set()
+        self.lock = threading.Lock()
+        self.keyboard_listener = None
+        self.control_server: Optional[socketserver.TCPServer] = None
+        self.control_file: Optional[Path] = None
+        self.control_file_offset = 0
+        # When nobody is around to press keys, every prompt is answered as soon as it's shown.
+        self.unattended = False
 
-    def wait_for_press(self, key: str, action_description: str, renderer: RenderingManager):
-        self.desired_key_press = key
-        self.action_description = action_description
-        listener = keyboard.Listener(on_press=self.on_press)
-        listener.start()
-        while not self.done:
-            renderer.begin_rendering("wait_for_press")
-            renderer.draw_string_2d(300, 300, 3, 3, f"Press {self.desired_key_press} to {self.action_description}.", renderer.cyan())
-            renderer.end_rendering()
-            time.sleep(.1)
-        renderer.begin_rendering("wait_for_press")
-        renderer.end_rendering()
-        listener.stop()
-        listener.join()
-
-    def on_press(self, key):
-        char = None
+    def press(self, key: str):
+        with self.lock:
+            self.pending.add(key)
+
+    def take(self, key: str) -> bool:
+        """
+        Consumes a pending press of the key, returning whether there was one.
+        """
+        self.poll_control_file()
+        with self.lock:
+            if key in self.pending:
+                self.pending.discard(key)
+                return True
+            return False
+
+    def discard(self, key: str):
+        self.poll_control_file()
+        with self.lock:
+            self.pending.discard(key)
+
+    def start_keyboard(self):
+        """
+        Starts listening to the keyboard, once. Prompts call this, so it only happens if something asks.
+        """
+        if self.keyboard_listener is not None:
+            return
+        # Imported here because pynput needs a display server, which headless runs don't have.
+        from pynput import keyboard
+
+        def on_press(key):
+            char = getattr(key, 'char', None)
+            if char:
+                self.press(char)
+
+        self.keyboard_listener = keyboard.Listener(on_press=on_press)
+        self.keyboard_listener.start()
+
+    def listen_on_socket(self, port: int = CONTROL_PORT):
+        """
+        Accepts key presses from local connections, one key per line.
+        """
+        key_input = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    key = line.decode(errors='ignore').strip()
+                    if key:
+                        key_input.press(key)
+
+        self.control_server = socketserver.ThreadingTCPServer(('127.0.0.1', port), Handler)
+        self.control_server.daemon_threads = True
+        threading.Thread(target=self.control_server.serve_forever, daemon=True).start()
+
+    def watch_file(self, path: Path):
+        """
+        Takes key presses from lines appended to the file. Whatever is in it already is ignored.
+        """
+        self.control_file = path
+        self.control_file_offset = path.stat().st_size if path.exists() else 0
+
+    def poll_control_file(self):
+        if self.control_file is None:
+            return
         try:
-            char = key.char
-        except AttributeError:
-            pass
+            size = self.control_file.stat().st_size
+        except FileNotFoundError:
+            self.control_file_offset = 0
+            return
+        if size < self.control_file_offset:
+            self.control_file_offset = 0  # The file was truncated or replaced.
+        if size == self.control_file_offset:
+            return
+        with open(self.control_file, 'rb') as f:
+            f.seek(self.control_file_offset)
+            text = f.read(size - self.control_file_offset)
+        # Only whole lines count, a partly written one is picked up next time.
+        complete = text[:text.rfind(b'\n') + 1]
+        self.control_file_offset += len(complete)
+        for line in complete.decode(errors='ignore').splitlines():
+            if line.strip():
+                self.press(line.strip())
+
+    def stop(self):
+        if self.keyboard_listener is not None:
+            self.keyboard_listener.stop()
+            self.keyboard_listener = None
+        if self.control_server is not None:
+            self.control_server.shutdown()
+            self.control_server.server_close()
+            self.control_server = None
+
+
+# Shared by everything in the script, so there's only ever one keyboard listener.
+key_input = KeyInput()
+
+
+class Prompt:
+    """
+    Asks for a key press. Call tick() every tick until it returns True; the game keeps running meanwhile.
+    Presses from before the prompt was shown don't count.
+    """
+
+    def __init__(self, key: str, action_description: str, renderer: RenderingManager,
+                 key_input: KeyInput = key_input):
+        self.key = key
+        self.action_description = action_description
+        self.renderer = renderer
+        self.scheduler = render_scheduler(renderer)
+        self.key_input = key_input
+        self.shown = False
+
+    def tick(self) -> bool:
+        if self.key_input.unattended:
+            return True
+        if not self.shown:
+            self.key_input.start_keyboard()
+            self.key_input.discard(self.key)
+            self.scheduler.show(RENDER_GROUP, text_2d(300, 300, 3, f"Press {self.key} to {self.action_description}.",
+                                                      self.renderer.cyan()))
+            self.shown = True
+            return False
+        if not self.key_input.take(self.key):
+            return False
+        self.scheduler.clear(RENDER_GROUP)
+        return True
+
+
+class Prompter:
+    """
+    Shows one prompt at a time, for the script or an event. Call wait_for_press every tick with the same arguments;
+    it returns True on the tick the key gets pressed. Asking for something else replaces the prompt.
+    """
 
-        if char == self.desired_key_press:
-            self.done = True
+    def __init__(self, renderer: RenderingManager, key_input: KeyInput = key_input):
+        self.renderer = renderer
+        self.key_input = key_input
+        self.prompt: Optional[Prompt] = None
 
+    def wait_for_press(self, key: str, action_description: str) -> bool:
+        prompt = self.prompt
+        if prompt is None or (prompt.key, prompt.action_description) != (key, action_description):
+            prompt = self.prompt = Prompt(key, action_description, self.renderer, self.key_input)
+        if prompt.tick():
+            self.prompt = None
+            return True
+        return False